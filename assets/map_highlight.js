@@ -0,0 +1,65 @@
+// Clientside highlighting for extended_map_dash8.py.
+// Applies a region or branch click to the figure already in the browser, using the
+// lookup tables from map_layers.highlight_lookup(), which are sent once with the layout.
+// The selection is kept in the same [regions, company] form as the server callback.
+// Branches are identified by their row id (the branch layer's customdata), since the
+// layer may hold only the branches in view; the layer's trace index comes from the
+// 'branch-trace' store, set from the figure the server built.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside);
+window.dash_clientside.map = Object.assign({}, window.dash_clientside.map, {
+    highlight: function (clickData, nClicks, lookup, selection, figure, branchTrace) {
+        const triggered = (window.dash_clientside.callback_context.triggered || [])
+            .map(function (t) { return t.prop_id; });
+        let regions = [];
+        let company = null;
+
+        if (!triggered.includes('reset-btn.n_clicks') && clickData) {
+            regions = new Set((selection && selection[0]) || []);
+            const point = clickData.points[0];
+            if ('location' in point) {
+                regions.add(lookup.regions[lookup.locations[String(point.location)]]);
+            } else {
+                const row = 'customdata' in point ? point.customdata : point.pointIndex;
+                const code = lookup.branch_company[row];
+                if (code >= 0) {
+                    company = lookup.companies[code];
+                    lookup.company_regions[code].forEach(function (i) { regions.add(lookup.regions[i]); });
+                }
+            }
+            regions = Array.from(regions).sort();
+        }
+
+        const regionPoints = regions.map(function (name) { return lookup.regions.indexOf(name); })
+            .filter(function (i) { return i >= 0; });
+        let branchPoints = null;
+        if (regions.length && company !== null) {
+            branchPoints = lookup.company_branches[lookup.companies.indexOf(company)];
+        } else if (regions.length) {
+            branchPoints = [].concat.apply([], regionPoints.map(function (i) { return lookup.region_branches[i]; }))
+                .sort(function (a, b) { return a - b; });
+        }
+
+        const rows = figure.data[branchTrace].customdata;
+        if (branchPoints !== null && rows) {
+            // Row ids to positions in the branch layer as it is now
+            const wanted = new Set(branchPoints);
+            branchPoints = [];
+            rows.forEach(function (row, i) {
+                if (wanted.has(row)) {
+                    branchPoints.push(i);
+                }
+            });
+        }
+
+        const data = figure.data.slice();
+        data[0] = Object.assign({}, data[0], {selectedpoints: regionPoints});
+        data[branchTrace] = Object.assign({}, data[branchTrace]);
+        if (branchPoints === null) {
+            delete data[branchTrace].selectedpoints;
+        } else {
+            data[branchTrace].selectedpoints = branchPoints;
+        }
+        return [Object.assign({}, figure, {data: data}), company === null ? (regions.length ? [regions] : []) : [regions, company]];
+    }
+});
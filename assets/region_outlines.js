@@ -0,0 +1,36 @@
+// Clientside zoom callback for extended_map_dash8.py.
+// Swaps in the region outline level for the current zoom, either decoded from TopoJSON
+// (assets/topology.js) or as the URL of the level's static GeoJSON file.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside);
+window.dash_clientside.map = Object.assign({}, window.dash_clientside.map, {
+    regionOutlines: function (relayoutData, level, outlines, figure) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (!relayoutData || !('mapbox.zoom' in relayoutData)) {
+            return [noUpdate, noUpdate];
+        }
+        let next = 0;
+        outlines.min_zoom.forEach(function (zoom, i) {
+            if (relayoutData['mapbox.zoom'] >= zoom) {
+                next = i;
+            }
+        });
+        if (next === level) {
+            return [noUpdate, noUpdate];
+        }
+        let geojson;
+        if (outlines.urls) {
+            geojson = outlines.urls[next];
+        } else {
+            // Decode each level once per page
+            const decoded = window.mapTopology.decoded = window.mapTopology.decoded || {};
+            if (!(next in decoded)) {
+                decoded[next] = window.mapTopology.feature(outlines.levels[next], outlines.name);
+            }
+            geojson = decoded[next];
+        }
+        const data = figure.data.slice();
+        data[0] = Object.assign({}, data[0], {geojson: geojson});
+        return [Object.assign({}, figure, {data: data}), next];
+    }
+});
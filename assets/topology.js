@@ -0,0 +1,48 @@
+// TopoJSON decoding for the region outlines (see topology.py).
+// mapTopology.feature() turns one object of a quantized, delta-encoded topology back
+// into a GeoJSON FeatureCollection. Standalone, as it is also copied into the static
+// export bundles (map_export.py).
+
+window.mapTopology = (function () {
+    function decodeArcs(topology) {
+        const scale = topology.transform.scale;
+        const translate = topology.transform.translate;
+        return topology.arcs.map(function (arc) {
+            let x = 0;
+            let y = 0;
+            return arc.map(function (step) {
+                x += step[0];
+                y += step[1];
+                return [x * scale[0] + translate[0], y * scale[1] + translate[1]];
+            });
+        });
+    }
+
+    function ring(arcs, indexes) {
+        const points = [];
+        indexes.forEach(function (i, n) {
+            const arc = i >= 0 ? arcs[i] : arcs[~i].slice().reverse();
+            // Consecutive arcs share their junction point
+            points.push.apply(points, n === 0 ? arc : arc.slice(1));
+        });
+        return points;
+    }
+
+    function feature(topology, name) {
+        const arcs = decodeArcs(topology);
+        const features = topology.objects[name].geometries.map(function (geometry) {
+            let shape = null;
+            if (geometry.type === 'Polygon') {
+                shape = {type: 'Polygon', coordinates: geometry.arcs.map(function (r) { return ring(arcs, r); })};
+            } else if (geometry.type === 'MultiPolygon') {
+                shape = {type: 'MultiPolygon', coordinates: geometry.arcs.map(function (p) {
+                    return p.map(function (r) { return ring(arcs, r); });
+                })};
+            }
+            return {id: geometry.id, type: 'Feature', properties: geometry.properties || {}, geometry: shape};
+        });
+        return {type: 'FeatureCollection', features: features};
+    }
+
+    return {feature: feature};
+})();
@@ -0,0 +1,62 @@
+import argparse
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from branch_data import coerce_branch_columns, ingest_branches
+
+# Throughput of branch ingestion on synthetic rows: the row-wise apply() the scripts
+# used to run versus ingest_branches().
+#   python bench_ingestion.py --rows 1000000
+
+
+def synthetic_branches(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Credit Union {i}" for i in range(60)])
+    df = pd.DataFrame({
+        'Name': names[rng.integers(0, len(names), rows)],
+        # Some branches unnamed, as in the workbook
+        'Branch': np.where(rng.random(rows) < 0.01, None,
+                           np.char.add('Branch ', rng.integers(0, 100000, rows).astype(str))),
+        'head': np.where(rng.random(rows) < 0.1, 'Y', 'N'),
+        'Lat': rng.uniform(41.7, 56.9, rows),
+        'Long': rng.uniform(-95.2, -74.3, rows),
+        'bank': np.where(rng.random(rows) < 0.5, 1.0, np.nan),
+    })
+    return coerce_branch_columns(df)
+
+
+def legacy_ingest(branches):
+    branches['hover'] = branches.apply(lambda x: f"Branch: {x['Branch']}, CU: {x['Name']}", axis=1)
+    branches = branches.copy()
+    branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
+    return gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
+
+
+def timed(label, func, branches):
+    start = time.perf_counter()
+    result = func(branches.copy())
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {elapsed:8.3f} s  {len(branches) / elapsed:14,.0f} rows/s")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--legacy-rows', type=int, default=None,
+                        help="rows for the apply() baseline (defaults to --rows; it is slow)")
+    args = parser.parse_args()
+
+    branches = synthetic_branches(args.rows)
+    vectorized = timed('vectorized', lambda df: ingest_branches(df, hover="Branch: {Branch}, CU: {Name}"), branches)
+
+    legacy_rows = args.legacy_rows or args.rows
+    legacy = timed('apply', legacy_ingest, branches.head(legacy_rows))
+
+    sample = min(len(legacy), 1000)
+    assert (vectorized['hover'].head(sample).to_numpy() == legacy['hover'].head(sample).to_numpy()).all()
+    assert vectorized.geometry.head(sample).geom_equals(legacy.geometry.head(sample)).all()
@@ -0,0 +1,79 @@
+import argparse
+import json
+import time
+
+import geopandas as gpd
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+import shapely
+from shapely.geometry import box
+
+from fast_json import Fragments, dumps, geojson_bytes, loads
+from figure_patch import plain_figure
+from topology import encode_topology
+
+# Region GeoJSON and figure serialization: json.loads(gdf.to_json()) plus plotly's
+# stdlib encoder versus fast_json's direct encoding and TopoJSON, and a disk-cached
+# figure that refers to its outlines through Fragments instead of holding them.
+# The synthetic regions tile an Ontario-sized box, so neighbours share borders.
+#   python bench_serialization.py --regions 50 --vertices 4000
+
+
+def synthetic_regions(count, vertices, seed=0):
+    rng = np.random.default_rng(seed)
+    extent = box(-95, 42, -75, 56)
+    centers = shapely.multipoints(np.column_stack([rng.uniform(-95, -75, count), rng.uniform(42, 56, count)]))
+    cells = shapely.intersection(shapely.get_parts(shapely.voronoi_polygons(centers, extend_to=extent)), extent)
+    # Densify to roughly `vertices` points per region
+    shapes = shapely.segmentize(cells, shapely.length(cells).mean() / vertices)
+    return gpd.GeoDataFrame(
+        {'ERNAME': [f"Region {i}" for i in range(len(shapes))], 'PRUID': '35'},
+        geometry=shapes,
+        crs="EPSG:4326",
+    )
+
+
+def figure_for(regions, geojson):
+    return go.Figure(go.Choroplethmapbox(geojson=geojson, locations=regions.index, z=np.arange(len(regions))))
+
+
+def timed(label, func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    size = f"{len(result):14,d} bytes" if isinstance(result, (bytes, str)) else ""
+    print(f"{label:>28}: {best * 1000:9.1f} ms  {size}")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--regions', type=int, default=50)
+    parser.add_argument('--vertices', type=int, default=4000)
+    parser.add_argument('--precision', type=int, default=6)
+    args = parser.parse_args()
+
+    regions = synthetic_regions(args.regions, args.vertices)
+
+    print("GeoJSON")
+    current = timed('to_json + json.loads', lambda: json.loads(regions.to_json()))
+    timed('to_json (text)', lambda: regions.to_json())
+    encoded = timed('geojson_bytes', lambda: geojson_bytes(regions, args.precision))
+    timed('geojson_bytes + loads', lambda: loads(geojson_bytes(regions, args.precision)))
+    timed('TopoJSON', lambda: dumps(encode_topology(regions)), repeat=1)
+
+    print("Figure")
+    fig = figure_for(regions, current)
+    timed('pio.to_json (json engine)', lambda: pio.to_json(fig, validate=False, engine='json'))
+    timed('pio.to_json (auto engine)', lambda: pio.to_json(fig, validate=False))
+
+    fragments = Fragments()
+    fragments.add('regions', loads(encoded))
+    packed = plain_figure(figure_for(regions, {}))
+    packed['data'][0]['geojson'] = fragments.ref('regions')
+    entry = timed('disk entry (by reference)', lambda: dumps(packed))
+    timed('disk entry (GeoJSON inline)', lambda: dumps(fragments.resolve(packed)))
+    timed('loads + resolve', lambda: fragments.resolve(loads(entry)))
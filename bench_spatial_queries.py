@@ -0,0 +1,40 @@
+import argparse
+import time
+
+import numpy as np
+
+from bench_ingestion import synthetic_branches
+from branch_locator import BranchLocator
+
+# Timing of the branch_locator queries on synthetic branches spread over Ontario:
+# building the index, then batched queries with every branch as a query point.
+#   python bench_spatial_queries.py --rows 1000000
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:>28}: {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--radius', type=float, default=1000, help="metres")
+    args = parser.parse_args()
+
+    branches = synthetic_branches(args.rows)
+    lat, lon = branches['Lat'].to_numpy(), branches['Long'].to_numpy()
+
+    locator = timed('index', lambda: BranchLocator(branches))
+    timed('single within_radius x1000', lambda: [locator.within_radius(lat[i], lon[i], args.radius * 10)
+                                                 for i in range(1000)])
+    timed('single k_nearest x1000', lambda: [locator.k_nearest(lat[i], lon[i], args.k) for i in range(1000)])
+    queries, _, _ = timed(f'bulk_k_nearest k={args.k}', lambda: locator.bulk_k_nearest(lat, lon, args.k))
+    assert np.all(np.bincount(queries) == args.k)
+    found = timed(f'bulk_within_radius {args.radius:g} m', lambda: locator.bulk_within_radius(lat, lon, args.radius))
+    print(f"{len(found[0]):>28,} matches")
+    pairs = timed(f'pairs_within {args.radius:g} m', lambda: locator.pairs_within(args.radius))
+    print(f"{len(pairs[0]):>28,} pairs")
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR
+
+# Zoom-level marker clustering for the branch map, precomputed once per workbook.
+# Branches are binned on a Web Mercator grid whose cells are CLUSTER_RADIUS screen pixels
+# wide at each zoom, so cells halve with every zoom step and each cluster at zoom z is the
+# union of up to four clusters at z + 1. Levels are built from MAX_CLUSTER_ZOOM upwards,
+# each from the one below it, with branch counts per credit union carried along. A map
+# view then needs only the clusters of its zoom level whose centres fall in the viewport;
+# past MAX_CLUSTER_ZOOM the clusters expand into their individual branches.
+
+TILE_SIZE = 512  # pixels per Mapbox GL tile at zoom 0
+# Cell width in pixels; TILE_SIZE / CLUSTER_RADIUS must be a power of two so cells nest
+CLUSTER_RADIUS = 64
+MAX_CLUSTER_ZOOM = 14
+CLUSTER_VERSION = 1
+
+
+def mercator(lat, lon):
+    # Web Mercator coordinates scaled to [0, 1)
+    lat = np.clip(np.asarray(lat, dtype='float64'), -85.05112878, 85.05112878)
+    x = np.asarray(lon, dtype='float64') / 360 + 0.5
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi)
+    return x, y
+
+
+def inverse_mercator(x, y):
+    lon = (np.asarray(x) - 0.5) * 360
+    lat = np.degrees(2 * np.arctan(np.exp((0.5 - np.asarray(y)) * 2 * np.pi)) - np.pi / 2)
+    return lat, lon
+
+
+def _cells(zoom, radius):
+    # Grid cells per axis at `zoom`
+    return (TILE_SIZE // radius) << zoom
+
+
+def _cell_keys(x, y, cells):
+    ix = np.clip(np.floor(x * cells).astype('int64'), 0, cells - 1)
+    iy = np.clip(np.floor(y * cells).astype('int64'), 0, cells - 1)
+    return ix * cells + iy
+
+
+class ClusterIndex:
+    def __init__(self, branches, company_column='Name', radius=CLUSTER_RADIUS, max_zoom=MAX_CLUSTER_ZOOM,
+                 levels=None):
+        self.radius = radius
+        self.max_zoom = max_zoom
+        self.lat = branches['Lat'].to_numpy(dtype='float64')
+        self.lon = branches['Long'].to_numpy(dtype='float64')
+        codes, self.companies = pd.factorize(branches[company_column].to_numpy())
+        self.company_codes = codes
+        self.located = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon) & (codes >= 0))
+        self.levels = levels if levels is not None else self._build()
+        # Branch rows grouped by their cluster at max_zoom, for expanding clusters
+        top = self.levels[max_zoom]
+        self.branch_order = self.located[np.argsort(top['branch_cluster'], kind='stable')]
+        self.branch_bounds = np.concatenate([[0], np.cumsum(top['count'])])
+
+    def _build(self):
+        rows = self.located
+        x, y = mercator(self.lat[rows], self.lon[rows])
+        levels = [None] * (self.max_zoom + 1)
+
+        # Finest level straight from the branches
+        ids, branch_cluster = np.unique(_cell_keys(x, y, _cells(self.max_zoom, self.radius)), return_inverse=True)
+        weights, cx, cy = np.ones(len(rows)), x, y
+        member_cluster, first = branch_cluster, rows
+        company_keys = branch_cluster.astype('int64') * len(self.companies) + self.company_codes[rows]
+        pairs, pair_counts = np.unique(company_keys, return_counts=True)
+
+        for zoom in range(self.max_zoom, -1, -1):
+            count = np.bincount(member_cluster, weights=weights)
+            level = {
+                'count': count.astype('int64'),
+                'x': np.bincount(member_cluster, weights=cx * weights) / count,
+                'y': np.bincount(member_cluster, weights=cy * weights) / count,
+                # Smallest branch row in each cluster; the branch itself for singletons
+                'first': np.full(len(count), np.iinfo('int64').max, dtype='int64'),
+                'pairs': pairs,
+                'pair_counts': pair_counts,
+            }
+            np.minimum.at(level['first'], member_cluster, first)
+            if zoom == self.max_zoom:
+                level['branch_cluster'] = branch_cluster
+            levels[zoom] = level
+            if zoom == 0:
+                level['parent'] = np.zeros(len(count), dtype='int64')
+                break
+
+            # Parent cells at zoom - 1: the grid there has half as many cells per axis
+            child_cells = _cells(zoom, self.radius)
+            ix, iy = ids // child_cells, ids % child_cells
+            ids, parent = np.unique((ix // 2) * (child_cells // 2) + iy // 2, return_inverse=True)
+            level['parent'] = parent
+            # The next level aggregates this level's clusters, weighted by their counts
+            member_cluster, weights, cx, cy, first = parent, count, level['x'], level['y'], level['first']
+            pair_cluster, company = np.divmod(pairs, len(self.companies))
+            pairs, inverse = np.unique(parent[pair_cluster] * len(self.companies) + company, return_inverse=True)
+            pair_counts = np.bincount(inverse, weights=pair_counts).astype('int64')
+        return levels
+
+    def level_zoom(self, zoom):
+        return int(min(max(np.floor(zoom), 0), self.max_zoom))
+
+    def clusters(self, zoom, bounds):
+        # Cluster positions at `zoom` whose centres fall within bounds = (west, south, east, north),
+        # padded by a cell so clusters reaching into the view from outside are included
+        level_zoom = self.level_zoom(zoom)
+        level = self.levels[level_zoom]
+        west, south, east, north = bounds
+        pad = 1 / _cells(level_zoom, self.radius)
+        x0, y1 = mercator(south, west)
+        x1, y0 = mercator(north, east)
+        x0, y0, x1, y1 = x0 - pad, y0 - pad, x1 + pad, y1 + pad
+        return np.flatnonzero((level['x'] >= x0) & (level['x'] <= x1) & (level['y'] >= y0) & (level['y'] <= y1))
+
+    def breakdown(self, zoom, cluster):
+        # [(company, branches), ...] in a cluster, largest first
+        level = self.levels[self.level_zoom(zoom)]
+        n = len(self.companies)
+        start, end = np.searchsorted(level['pairs'], [cluster * n, (cluster + 1) * n])
+        counts = level['pair_counts'][start:end]
+        order = np.argsort(-counts, kind='stable')
+        return [(self.companies[level['pairs'][start + i] - cluster * n], int(counts[i])) for i in order]
+
+    def branches(self, clusters):
+        # Branch rows of clusters at max_zoom
+        bounds = self.branch_bounds
+        parts = [self.branch_order[bounds[c]:bounds[c + 1]] for c in clusters]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype='int64')
+
+    def view(self, zoom, bounds):
+        # (clusters, branch rows) to draw for a map view. Past max_zoom every cluster in
+        # view is expanded; below it only single-branch clusters are drawn as branches
+        level = self.levels[self.level_zoom(zoom)]
+        clusters = self.clusters(zoom, bounds)
+        if zoom > self.max_zoom:
+            return np.empty(0, dtype='int64'), self.branches(clusters)
+        single = level['count'][clusters] == 1
+        return clusters[~single], level['first'][clusters[single]]
+
+    def save(self, path):
+        arrays = {f"{zoom}_{name}": value for zoom, level in enumerate(self.levels) for name, value in level.items()}
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, radius=self.radius, max_zoom=self.max_zoom, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, branches, company_column='Name'):
+        with np.load(path) as data:
+            max_zoom = int(data['max_zoom'])
+            levels = [{} for _ in range(max_zoom + 1)]
+            for key in data.files:
+                zoom, _, name = key.partition('_')
+                if zoom.isdigit():
+                    levels[int(zoom)][name] = data[key]
+            return cls(branches, company_column, int(data['radius']), max_zoom, levels)
+
+
+def load_cluster_index(branches, version, cache_dir=CACHE_DIR, radius=CLUSTER_RADIUS, max_zoom=MAX_CLUSTER_ZOOM):
+    # Cluster index for `branches`, cached on disk under the workbook's version
+    path = os.path.join(cache_dir, f"clusters-{version}-r{radius}-z{max_zoom}-v{CLUSTER_VERSION}.npz")
+    if version is not None and os.path.exists(path):
+        try:
+            return ClusterIndex.load(path, branches)
+        except (OSError, ValueError, KeyError):
+            pass
+    index = ClusterIndex(branches, radius=radius, max_zoom=max_zoom)
+    if version is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        index.save(path)
+    return index
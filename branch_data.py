@@ -0,0 +1,125 @@
+import os
+import string
+
+import geopandas as gpd
+import pandas as pd
+
+from data_cache import CACHE_DIR, file_digest, read_meta, write_meta
+
+# Branch workbook loading with a typed columnar cache.
+# The workbook is parsed with openpyxl only when its contents change; every other
+# start reads a Parquet copy keyed by the workbook's mtime and content hash.
+
+COORDINATE_COLUMNS = ['Lat', 'Long']
+CATEGORICAL_COLUMNS = ['Name', 'bank', 'head']
+
+
+def coerce_branch_columns(df):
+    # Coordinates sometimes arrive as text (e.g. "-79.526240"), so parse them explicitly
+    for column in COORDINATE_COLUMNS:
+        values = df[column]
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            values = values.astype(str).str.strip()
+        df[column] = pd.to_numeric(values, errors='coerce').astype('float64')
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def _cache_paths(file_path, cache_dir):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(cache_dir, f"{stem}.meta.json"), os.path.join(cache_dir, f"{stem}-{{digest}}.parquet")
+
+
+def _read_cache(cache_path):
+    branches = pd.read_parquet(cache_path)
+    # Arrow round-trips string categories but not numeric ones such as 'bank'
+    for column in CATEGORICAL_COLUMNS:
+        if column in branches.columns and not isinstance(branches[column].dtype, pd.CategoricalDtype):
+            branches[column] = branches[column].astype('category')
+    return branches
+
+
+def load_branches(file_path='sherkat.xlsx', cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path, cache_template = _cache_paths(file_path, cache_dir)
+    stat = os.stat(file_path)
+    meta = read_meta(meta_path)
+
+    # Unchanged mtime and size: trust the cache without hashing the workbook
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        digest = meta.get('digest')
+    else:
+        digest = file_digest(file_path)
+
+    cache_path = cache_template.format(digest=digest)
+    if digest == meta.get('digest') and os.path.exists(cache_path):
+        if meta.get('mtime_ns') != stat.st_mtime_ns:
+            # Touched but not edited: refresh the mtime key only
+            write_meta(meta_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest})
+        return _read_cache(cache_path)
+
+    branches = coerce_branch_columns(pd.read_excel(file_path))
+
+    tmp_path = cache_path + '.tmp'
+    branches.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+
+    # Drop the cache written for the previous version of the workbook
+    previous = meta.get('digest')
+    if previous and previous != digest:
+        try:
+            os.remove(cache_template.format(digest=previous))
+        except OSError:
+            pass
+
+    write_meta(meta_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest})
+    return branches
+
+
+def branches_version(file_path='sherkat.xlsx', cache_dir=CACHE_DIR):
+    # Content hash of the cached workbook; derived caches key on it
+    meta_path, _ = _cache_paths(file_path, cache_dir)
+    return read_meta(meta_path).get('digest')
+
+
+def format_columns(df, template):
+    # Columnar equivalent of df.apply(lambda x: template.format(**x), axis=1)
+    result = pd.Series('', index=df.index, dtype='str')
+    for literal, field, _, _ in string.Formatter().parse(template):
+        if literal:
+            result = result + literal
+        if field is not None:
+            result = result + _as_text(df[field])
+    return result
+
+
+def _as_text(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Format each category once; code -1 (missing) picks the trailing 'nan'
+        labels = pd.Index(column.cat.categories.astype(str).tolist() + ['nan'])
+        return pd.Series(labels.take(column.cat.codes.to_numpy()), index=column.index, dtype='str')
+    # Through object so missing values read 'nan' as str() gives them, instead of
+    # staying NA under the str dtype and blanking the whole text
+    return pd.Series(column.to_numpy(dtype=object).astype(str), index=column.index, dtype='str')
+
+
+def ingest_branches(branches, hover="Branch: {Branch}"):
+    # Hover text and point geometry built column-wise, without per-row Python calls
+    if hover is not None:
+        branches['hover'] = format_columns(branches, hover)
+    return gpd.GeoDataFrame(
+        branches,
+        geometry=gpd.points_from_xy(branches['Long'], branches['Lat']),
+        crs="EPSG:4326",
+    )
+
+
+if __name__ == '__main__':
+    # Rebuild (or validate) the cache ahead of starting the apps
+    df = load_branches()
+    print(f"{len(df)} branches cached")
+    print(df.dtypes)
@@ -0,0 +1,56 @@
+import numpy as np
+
+from branch_clusters import inverse_mercator, mercator
+from figure_cache import FigureCache
+
+# Branch density for the heatmap render mode of the branch map.
+# The weighted grid comes straight from the ClusterIndex levels (branch_clusters.py),
+# which already hold each cell's centre and its branch count per credit union, so a
+# density layer for any set of credit unions is a mask and a bincount over one level's
+# (cell, company) pairs rather than a pass over the branches. The grid is taken
+# DENSITY_DETAIL levels finer than the view's zoom, giving cells of a quarter of
+# CLUSTER_RADIUS pixels on screen. Grids are cached per (level, credit unions);
+# from POINT_ZOOM on the map draws the branches themselves instead.
+
+DENSITY_DETAIL = 2  # zoom levels finer than the view
+POINT_ZOOM = 10
+DENSITY_CACHE_SIZE = 64
+
+
+def filter_key(companies):
+    # Canonical form of a credit union filter; None or empty means every credit union
+    return tuple(sorted(set(companies), key=str)) if companies else None
+
+
+class BranchDensity:
+    def __init__(self, cluster_index, cache_size=DENSITY_CACHE_SIZE):
+        self.index = cluster_index
+        self.cache = FigureCache(cache_size)
+
+    def grid(self, level_zoom, companies=None):
+        # (x, y, branches) of the non-empty cells of a ClusterIndex level, in Mercator x/y
+        key = (level_zoom, filter_key(companies))
+        return self.cache.get(key, lambda: self._grid(*key))
+
+    def _grid(self, level_zoom, companies):
+        level = self.index.levels[level_zoom]
+        if companies is None:
+            cells, weights = np.arange(len(level['count'])), level['count']
+        else:
+            cell, company = np.divmod(level['pairs'], len(self.index.companies))
+            keep = np.isin(self.index.companies, companies)[company]
+            weights = np.bincount(cell[keep], weights=level['pair_counts'][keep], minlength=len(level['count']))
+            cells = np.flatnonzero(weights)
+            weights = weights[cells].astype('int64')
+        return level['x'][cells], level['y'][cells], weights
+
+    def view(self, zoom, bounds, companies=None):
+        # (lat, lon, branches) of the grid cells within bounds = (west, south, east, north)
+        level_zoom = self.index.level_zoom(zoom + DENSITY_DETAIL)
+        x, y, weights = self.grid(level_zoom, companies)
+        west, south, east, north = bounds
+        x0, y1 = mercator(south, west)
+        x1, y0 = mercator(north, east)
+        inside = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+        lat, lon = inverse_mercator(x[inside], y[inside])
+        return lat, lon, weights[inside]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# Precomputed row-position indexes over the branch table.
+# Built once at load; figure code slices with .iloc[positions] instead of running a
+# boolean mask over every row for each company or region.
+
+EMPTY = np.empty(0, dtype='int64')
+
+
+def group_positions(values):
+    # {value: sorted row positions} in one factorize + argsort pass; missing values are skipped
+    codes, uniques = pd.factorize(values, sort=False)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    starts = np.searchsorted(codes[order], 0)
+    bounds = starts + np.concatenate([[0], np.cumsum(counts)])
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+class BranchIndex:
+    def __init__(self, branches, company_column='Name', region_column='ERNAME'):
+        self.by_company = group_positions(branches[company_column].to_numpy())
+        self.by_region = {}
+        self.by_region_company = {}
+        if region_column in branches.columns:
+            self.by_region = group_positions(branches[region_column].to_numpy())
+            pairs = pd.MultiIndex.from_arrays([branches[region_column], branches[company_column]])
+            self.by_region_company = {
+                pair: positions for pair, positions in group_positions(pairs).items()
+                if not pd.isna(pair[0])
+            }
+
+    def company(self, name):
+        return self.by_company.get(name, EMPTY)
+
+    def region(self, name):
+        return self.by_region.get(name, EMPTY)
+
+    def region_company(self, region, company):
+        return self.by_region_company.get((region, company), EMPTY)
+
+    def select(self, regions=None, companies=None):
+        # Sorted positions of rows in any of `regions` and any of `companies` (None = all)
+        if regions is None and companies is None:
+            raise ValueError("select() needs regions, companies or both")
+        if regions is None:
+            parts = [self.company(name) for name in companies]
+        elif companies is None:
+            parts = [self.region(name) for name in regions]
+        else:
+            parts = [self.region_company(region, name) for region in regions for name in companies]
+        if not parts:
+            return EMPTY
+        return np.sort(np.concatenate(parts))
@@ -0,0 +1,178 @@
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+# Spatial lookups over the branch table.
+# Branch markers carry their row position in the branch table as customdata, so a click
+# names its row exactly. Clicks without it (older figures, other layers) fall back to a
+# nearest-neighbour lookup in an STRtree over the branches in a projected CRS, where
+# distances are in metres, limited to MAX_CLICK_DISTANCE so a click never snaps to a
+# branch the user did not click on.
+#
+# The same tree answers the analysts' queries: within_radius(), k_nearest() and
+# pairs_within(), plus bulk variants over many query points. Candidates come from the
+# tree in projected metres, widened by PROJECTION_SLACK, and are then filtered and
+# ranked on great-circle (haversine) distance, so results are exact in metres.
+
+PROJECTED_CRS = "EPSG:3347"  # Statistics Canada Lambert
+MAX_CLICK_DISTANCE = 100  # metres
+EARTH_RADIUS = 6_371_008.8  # metres, mean
+# EPSG:3347 stretches distances by up to a few percent over southern Canada
+PROJECTION_SLACK = 1.1
+MAX_SEARCH_RADIUS = 5_000_000  # metres
+# Query points per tree call in the bulk queries, to bound memory
+BATCH_SIZE = 65_536
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in metres, elementwise
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64')) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _sorted_by_query(queries, rows, distances):
+    # One float sort instead of a lexsort: the distance, scaled below 1, orders each
+    # query's run (query positions stay well inside float64's exact integer range)
+    if len(distances) == 0:
+        return queries, rows, distances
+    order = np.argsort(queries + distances / (2 * distances.max() + 1))
+    return queries[order], rows[order], distances[order]
+
+
+class BranchLocator:
+    def __init__(self, branches, crs=PROJECTED_CRS):
+        self.size = len(branches)
+        self.lat = branches['Lat'].to_numpy(dtype='float64')
+        self.lon = branches['Long'].to_numpy(dtype='float64')
+        self.transformer = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+        self.xy = self.project(self.lat, self.lon)
+        self.x, self.y = self.xy[:, 0].copy(), self.xy[:, 1].copy()
+        located = np.isfinite(self.xy).all(axis=1)
+        # Branches without coordinates get no point and so are never matched
+        self.points = np.where(located, shapely.points(self.xy), None)
+        self.tree = shapely.STRtree(self.points)
+        if located.any():
+            # Typical spacing between branches, for the first k_nearest() search radius
+            extent = np.ptp(self.xy[located], axis=0).prod()
+            self.spacing = max(np.sqrt(extent / located.sum()), 1.0)
+        else:
+            self.spacing = 1.0
+
+    def project(self, lat, lon):
+        x, y = self.transformer.transform(np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64'))
+        return np.column_stack([x, y])
+
+    def nearest(self, lat, lon, max_distance=MAX_CLICK_DISTANCE):
+        # Row position of the branch closest to (lat, lon), or None beyond max_distance
+        xy = self.project([lat], [lon])
+        if not np.isfinite(xy).all():
+            return None
+        rows = self.tree.query_nearest(shapely.points(xy[0]), max_distance=max_distance, all_matches=False)
+        return int(rows[0]) if len(rows) else None
+
+    def resolve(self, point):
+        # Row position for a clickData point, from its customdata when it has one
+        row = point.get('customdata')
+        if isinstance(row, list):
+            row = row[0] if row else None
+        if isinstance(row, int) and 0 <= row < self.size:
+            return row
+        if 'lat' in point and 'lon' in point:
+            return self.nearest(point['lat'], point['lon'])
+        return None
+
+    def _candidates(self, xy, radius):
+        # (query positions, rows) of the branches within `radius` projected metres of each
+        # query point; a bounding-box query on the tree, then a cheap planar distance
+        # check (much faster than the tree's dwithin predicate)
+        x, y = xy[:, 0], xy[:, 1]
+        queries, rows = self.tree.query(shapely.box(x - radius, y - radius, x + radius, y + radius))
+        dx = self.x[rows] - x[queries]
+        dy = self.y[rows] - y[queries]
+        keep = dx * dx + dy * dy <= radius * radius
+        return queries[keep], rows[keep]
+
+    def _within(self, lat, lon, radius, candidates=None):
+        # (query positions, rows, metres) for every branch within `radius` of each query
+        # point, ordered by query only; `candidates` is an optional boolean mask over the rows
+        lat = np.asarray(lat, dtype='float64')
+        lon = np.asarray(lon, dtype='float64')
+        queries, rows = self._candidates(self.project(lat, lon), radius * PROJECTION_SLACK)
+        if candidates is not None:
+            keep = candidates[rows]
+            queries, rows = queries[keep], rows[keep]
+        distances = haversine(lat[queries], lon[queries], self.lat[rows], self.lon[rows])
+        keep = distances <= radius
+        return queries[keep], rows[keep], distances[keep]
+
+    def bulk_within_radius(self, lat, lon, radius, candidates=None):
+        # (query positions, rows, metres) of the branches within `radius` metres of each
+        # query point, ordered by query, then distance
+        lat = np.atleast_1d(np.asarray(lat, dtype='float64'))
+        lon = np.atleast_1d(np.asarray(lon, dtype='float64'))
+        parts = []
+        for start in range(0, len(lat), BATCH_SIZE):
+            queries, rows, distances = self._within(lat[start:start + BATCH_SIZE], lon[start:start + BATCH_SIZE],
+                                                    radius, candidates)
+            parts.append((queries + start, rows, distances))
+        if not parts:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64'), np.empty(0)
+        return _sorted_by_query(*(np.concatenate(part) for part in zip(*parts)))
+
+    def within_radius(self, lat, lon, radius, candidates=None):
+        # (rows, metres) of the branches within `radius` metres of (lat, lon), nearest first
+        _, rows, distances = self.bulk_within_radius([lat], [lon], radius, candidates)
+        return rows, distances
+
+    def bulk_k_nearest(self, lat, lon, k, candidates=None, max_radius=MAX_SEARCH_RADIUS):
+        # (query positions, rows, metres) of the k nearest branches to each query point,
+        # ordered by query, then distance. The search radius starts near the typical branch
+        # spacing and doubles for the queries that have not found k branches yet; once k
+        # lie within the radius they are the k nearest overall
+        lat = np.atleast_1d(np.asarray(lat, dtype='float64'))
+        lon = np.atleast_1d(np.asarray(lon, dtype='float64'))
+        pending = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        # About twice k branches expected within the first radius
+        radius = self.spacing * np.sqrt(2 * k / np.pi)
+        parts = []
+        while len(pending):
+            last = radius >= max_radius
+            found = []
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = pending[start:start + BATCH_SIZE]
+                queries, rows, distances = self._within(lat[batch], lon[batch], min(radius, max_radius), candidates)
+                found.append((batch[queries], rows, distances))
+            queries, rows, distances = _sorted_by_query(*(np.concatenate(part) for part in zip(*found)))
+            counts = np.bincount(queries, minlength=len(lat))
+            done = (counts >= k) | last
+            # Rank within each query's run, keep the first k of the finished queries
+            starts = np.searchsorted(queries, queries)
+            keep = done[queries] & (np.arange(len(queries)) - starts < k)
+            parts.append((queries[keep], rows[keep], distances[keep]))
+            pending = pending[~done[pending]]
+            radius *= 2
+        if not parts:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64'), np.empty(0)
+        return _sorted_by_query(*(np.concatenate(part) for part in zip(*parts)))
+
+    def k_nearest(self, lat, lon, k, candidates=None, max_radius=MAX_SEARCH_RADIUS):
+        # (rows, metres) of the k branches nearest (lat, lon), nearest first
+        _, rows, distances = self.bulk_k_nearest([lat], [lon], k, candidates, max_radius)
+        return rows, distances
+
+    def pairs_within(self, distance):
+        # (rows, rows, metres) of every pair of branches within `distance` metres of each
+        # other, each pair once with the smaller row first
+        parts = []
+        for start in range(0, self.size, BATCH_SIZE):
+            left, right = self._candidates(self.xy[start:start + BATCH_SIZE], distance * PROJECTION_SLACK)
+            left = left + start
+            keep = left < right
+            left, right = left[keep], right[keep]
+            distances = haversine(self.lat[left], self.lon[left], self.lat[right], self.lon[right])
+            keep = distances <= distance
+            parts.append((left[keep], right[keep], distances[keep]))
+        if not parts:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64'), np.empty(0)
+        return _sorted_by_query(*(np.concatenate(part) for part in zip(*parts)))
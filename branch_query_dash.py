@@ -0,0 +1,166 @@
+import numpy as np
+import plotly.graph_objects as go
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from branch_locator import EARTH_RADIUS, BranchLocator
+from map_layers import branch_layer, category_color_map, color_legend, legend_panel, region_layer
+from dash import Dash, dcc, html, Input, Output, Patch
+from dash.exceptions import PreventUpdate
+
+# Branch query tool: click a branch to list the branches within a radius of it, its
+# nearest branches, or its nearest competitors (nearest branches of other credit
+# unions), answered by branch_locator.BranchLocator. Results are highlighted on the
+# map and listed under it with their distance.
+
+file_path = 'sherkat.xlsx'
+PROVINCE = '35'  # Ontario
+MAX_ROWS = 200  # Result rows listed under the map
+
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
+branch_locator = BranchLocator(branches_with_regions)
+geojson = to_geojson(economic_regions)
+
+branch_color_map = category_color_map(cu_branches1['Name'].unique())
+region_color_map = category_color_map(economic_regions['ERNAME'].unique())
+
+# Trace positions in the figure
+RESULTS, RADIUS = 2, 3
+
+
+def circle(lat, lon, radius, points=64):
+    # (lats, lons) of the circle `radius` metres around (lat, lon), on the sphere
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    bearing = np.linspace(0, 2 * np.pi, points + 1)
+    angle = radius / EARTH_RADIUS
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(angle) + np.cos(lat1) * np.sin(angle) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * np.sin(angle) * np.cos(lat1),
+                             np.cos(angle) - np.sin(lat1) * np.sin(lat2))
+    return np.degrees(lat2), np.degrees(lon2)
+
+
+def result_layer(rows):
+    results = branches_with_regions.iloc[rows]
+    return go.Scattermapbox(
+        lat=results["Lat"],
+        lon=results["Long"],
+        mode='markers',
+        marker={'size': 18, 'color': 'black', 'opacity': 0.35},  # Halo around each result
+        customdata=rows,
+        text=results["hover"],
+        hovertemplate="<b>Result:</b> %{text}<extra></extra>",
+        showlegend=False,
+    )
+
+
+def radius_layer(lat=(), lon=()):
+    return go.Scattermapbox(lat=lat, lon=lon, mode='lines', line={'width': 2, 'color': 'black'},
+                            hoverinfo='skip', showlegend=False)
+
+
+def create_map_figure():
+    fig = go.Figure([
+        region_layer(economic_regions, geojson, region_color_map),
+        branch_layer(branches_with_regions, branch_color_map),
+        result_layer(np.empty(0, dtype='int64')),
+        radius_layer(),
+    ])
+    fig.update_layout(
+        mapbox_style="open-street-map",
+        mapbox_center={"lat": 50, "lon": -85},
+        mapbox_zoom=5,
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        uirevision='map',
+    )
+    return fig
+
+
+def run_query(row, mode, radius_km, k):
+    # (rows, metres) for the query around branch `row`, nearest first, the branch itself excluded
+    lat, lon = branch_locator.lat[row], branch_locator.lon[row]
+    candidates = np.ones(branch_locator.size, dtype=bool)
+    candidates[row] = False
+    if mode == 'competitors':
+        candidates[branch_index.company(branches_with_regions['Name'].iloc[row])] = False
+    if mode == 'radius':
+        return branch_locator.within_radius(lat, lon, radius_km * 1000, candidates)
+    return branch_locator.k_nearest(lat, lon, int(k), candidates)
+
+
+def result_table(row, rows, distances):
+    origin = branches_with_regions.iloc[row]
+    results = branches_with_regions.iloc[rows[:MAX_ROWS]]
+    header = html.Tr([html.Th(label) for label in ["#", "Branch", "CU Name", "Economic Region", "Distance (km)"]])
+    body = [
+        html.Tr([html.Td(i + 1), html.Td(str(branch)), html.Td(str(name).strip()), html.Td(str(region)),
+                 html.Td(f"{distance / 1000:.2f}")])
+        for i, (branch, name, region, distance) in enumerate(
+            zip(results['Branch'], results['Name'], results['ERNAME'], distances[:MAX_ROWS]))
+    ]
+    more = [html.P(f"... and {len(rows) - MAX_ROWS} more")] if len(rows) > MAX_ROWS else []
+    return [html.P(f"{len(rows)} results for {origin['Branch']} ({str(origin['Name']).strip()})"),
+            html.Table([header] + body)] + more
+
+
+app = Dash(__name__)
+
+app.layout = html.Div([
+    html.Div([
+        dcc.Graph(id='map', figure=create_map_figure(), style={"height": "75vh"}),
+        legend_panel(color_legend(branch_color_map, "CU NAME")),
+    ], style={"position": "relative"}),
+    html.Div([
+        dcc.RadioItems(id='query-mode', value='radius', inline=True, options=[
+            {'label': 'Branches within', 'value': 'radius'},
+            {'label': 'Nearest branches', 'value': 'nearest'},
+            {'label': 'Nearest competitors', 'value': 'competitors'},
+        ]),
+        html.Label([" Radius (km) ", dcc.Input(id='query-radius', type='number', value=10, min=0.1, step=0.1)]),
+        html.Label([" N ", dcc.Input(id='query-k', type='number', value=5, min=1, max=1000, step=1)]),
+    ]),
+    dcc.Store(id='query-origin'),
+    html.Div(id='query-results', children=html.P("Click a branch to query around it.")),
+])
+
+
+@app.callback(
+    Output('query-origin', 'data'),
+    Input('map', 'clickData'),
+    prevent_initial_call=True
+)
+def select_origin(clickData):
+    # Region clicks carry no coordinates; only branch and result markers start a query
+    row = branch_locator.resolve(clickData['points'][0]) if clickData else None
+    if row is None:
+        raise PreventUpdate
+    return row
+
+
+@app.callback(
+    Output('map', 'figure'),
+    Output('query-results', 'children'),
+    Input('query-origin', 'data'),
+    Input('query-mode', 'value'),
+    Input('query-radius', 'value'),
+    Input('query-k', 'value'),
+    prevent_initial_call=True
+)
+def update_query(row, mode, radius_km, k):
+    if row is None or (mode == 'radius' and not radius_km) or (mode != 'radius' and not k):
+        raise PreventUpdate
+    rows, distances = run_query(row, mode, radius_km, k)
+    patch = Patch()
+    patch['data'][RESULTS] = result_layer(rows)
+    if mode == 'radius':
+        lat, lon = circle(branch_locator.lat[row], branch_locator.lon[row], radius_km * 1000)
+    elif len(distances):
+        # Ring through the farthest result
+        lat, lon = circle(branch_locator.lat[row], branch_locator.lon[row], distances[-1])
+    else:
+        lat, lon = (), ()
+    patch['data'][RADIUS] = radius_layer(lat, lon)
+    return patch, result_table(row, rows, distances)
+
+
+if __name__ == '__main__':
+    app.run_server(debug=True)
@@ -0,0 +1,157 @@
+import numpy as np
+import plotly.graph_objects as go
+from branch_data import branches_version
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from branch_locator import BranchLocator
+from branch_clusters import inverse_mercator, load_cluster_index
+from branch_density import POINT_ZOOM, BranchDensity
+from map_layers import (branch_layer, category_color_map, cluster_layer, color_legend, density_layer, legend_panel,
+                        region_layer)
+from map_viewport import DEFAULT_VIEW, GridIndex, padded_bounds, update_view, view_bounds
+from dash import Dash, dcc, html, Input, Output, State, Patch, ctx
+from dash.exceptions import PreventUpdate
+
+# Branch map for large branch tables: branches are drawn as zoom-level clusters
+# (branch_clusters.py) and only for the current viewport. Each pan or zoom sends the
+# clusters and single branches in view as a patch to two traces; clusters show their
+# branch count and, on hover, the count per credit union, and split into individual
+# branches as the map zooms in.
+# The density mode draws a heatmap of branch counts instead (branch_density.py), for
+# the credit unions picked in the filter, and the branches themselves from POINT_ZOOM on.
+
+file_path = 'sherkat.xlsx'
+PROVINCE = '35'  # Ontario
+HOVER_COMPANIES = 8  # Credit unions listed in a cluster's hover
+# Grid cells this far (in view sizes) outside the view still warm its edges
+DENSITY_MARGIN = 0.1
+
+cu_branches1, economic_regions, branches_with_regions, _ = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
+
+# Built once per workbook and cached on disk
+cluster_index = load_cluster_index(branches_with_regions, branches_version(file_path))
+branch_density = BranchDensity(cluster_index)
+branch_grid = GridIndex(branches_with_regions['Lat'], branches_with_regions['Long'])
+branch_locator = BranchLocator(branches_with_regions)
+geojson = to_geojson(economic_regions)
+
+branch_color_map = category_color_map(cu_branches1['Name'].unique())
+region_color_map = category_color_map(economic_regions['ERNAME'].unique())
+
+# Trace positions in the figure
+BRANCHES, CLUSTERS, DENSITY = 1, 2, 3
+
+
+def cluster_hover(zoom, clusters):
+    level = cluster_index.levels[cluster_index.level_zoom(zoom)]
+    texts = []
+    for cluster in clusters:
+        breakdown = cluster_index.breakdown(zoom, cluster)
+        lines = [f"<b>{level['count'][cluster]:,} branches</b>"]
+        lines += [f"{str(name).strip()}: {count:,}" for name, count in breakdown[:HOVER_COMPANIES]]
+        if len(breakdown) > HOVER_COMPANIES:
+            lines.append(f"... and {len(breakdown) - HOVER_COMPANIES} more credit unions")
+        texts.append("<br>".join(lines))
+    return texts
+
+
+def view_layers(view, mode='clusters', companies=None):
+    # (branch layer, cluster layer, density layer) for what is visible in `view`
+    zoom = view['zoom']
+    bounds = view_bounds(view)
+    clusters = rows = np.empty(0, dtype='int64')
+    density = (), (), ()
+    if mode == 'density' and zoom < POINT_ZOOM:
+        density = branch_density.view(zoom, padded_bounds(bounds, DENSITY_MARGIN), companies)
+    elif mode == 'density':
+        rows = branch_grid.query(bounds)
+        if companies:
+            rows = rows[np.isin(branches_with_regions['Name'].to_numpy()[rows], companies)]
+    else:
+        clusters, rows = cluster_index.view(zoom, bounds)
+    level = cluster_index.levels[cluster_index.level_zoom(zoom)]
+    lat, lon = inverse_mercator(level['x'][clusters], level['y'][clusters])
+    branches = branch_layer(branches_with_regions.iloc[rows], branch_color_map, rows=rows)
+    clusters = cluster_layer(lat, lon, level['count'][clusters], cluster_hover(zoom, clusters))
+    return branches, clusters, density_layer(*density)
+
+
+def create_map_figure(view=DEFAULT_VIEW, mode='clusters', companies=None):
+    fig = go.Figure([region_layer(economic_regions, geojson, region_color_map), *view_layers(view, mode, companies)])
+    fig.update_layout(
+        mapbox_style="open-street-map",
+        mapbox_center=view['center'],
+        mapbox_zoom=view['zoom'],
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        showlegend=False,
+        uirevision='map',
+    )
+    return fig
+
+
+app = Dash(__name__)
+
+app.layout = html.Div([
+    html.Div([
+        dcc.Graph(id='map', figure=create_map_figure(), style={"height": "95vh"}),
+        legend_panel(color_legend(branch_color_map, "CU NAME")),
+    ], style={"position": "relative"}),
+    html.Div([
+        dcc.RadioItems(id='render-mode', value='clusters', inline=True, options=[
+            {'label': 'Clusters', 'value': 'clusters'},
+            {'label': 'Density', 'value': 'density'},
+        ]),
+        dcc.Dropdown(id='companies', multi=True, placeholder="All credit unions", disabled=True,
+                     options=[{'label': str(name).strip(), 'value': name} for name in branch_color_map]),
+    ]),
+    dcc.Store(id='view', data=DEFAULT_VIEW),
+    html.Div(id='clicked-branch'),
+])
+
+
+@app.callback(
+    Output('map', 'figure'),
+    Output('view', 'data'),
+    Input('map', 'relayoutData'),
+    Input('render-mode', 'value'),
+    Input('companies', 'value'),
+    State('view', 'data'),
+    prevent_initial_call=True
+)
+def update_viewport(relayoutData, mode, companies, view):
+    # Redraw on a pan or zoom, and in the current view on a mode or filter change
+    if ctx.triggered_id == 'map':
+        view = update_view(relayoutData, view)
+        if view is None:
+            raise PreventUpdate
+    patch = Patch()
+    patch['data'][BRANCHES], patch['data'][CLUSTERS], patch['data'][DENSITY] = view_layers(view, mode, companies)
+    return patch, view
+
+
+@app.callback(
+    Output('companies', 'disabled'),
+    Input('render-mode', 'value')
+)
+def enable_filter(mode):
+    # Clusters count every credit union; the filter applies to the density mode
+    return mode != 'density'
+
+
+@app.callback(
+    Output('clicked-branch', 'children'),
+    Input('map', 'clickData'),
+    prevent_initial_call=True
+)
+def show_branch(clickData):
+    # Only branch markers name a branch; region and cluster clicks are ignored
+    point = clickData['points'][0] if clickData else {}
+    row = branch_locator.resolve(point) if point.get('curveNumber') == BRANCHES else None
+    if row is None:
+        raise PreventUpdate
+    return branches_with_regions['hover'].iloc[row]
+
+
+if __name__ == '__main__':
+    app.run_server(debug=True)
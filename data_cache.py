@@ -0,0 +1,40 @@
+import hashlib
+import json
+import os
+
+# Small helpers shared by the on-disk caches under .cache/
+
+CACHE_DIR = '.cache'
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(paths):
+    # (mtime, size) of every existing source file; cheap enough to check on each start
+    signature = {}
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature[os.path.basename(path)] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from fast_json import dumps, loads
+
+# Size-bounded JSON cache on local disk, shared by every worker process on the host.
+# Each entry is one file named after its dataset version and key, written to a unique
+# temporary file and renamed into place, so concurrent writers, whether threads of one
+# worker or separate workers, never see or clobber a partial entry, and a result built
+# by one gunicorn worker is read by the others instead of rebuilt.
+# Entries from other dataset versions are evicted first, then the least recently used.
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, version):
+        return os.path.join(self.directory, f"{_digest(version)[:16]}-{_digest(key)}.json")
+
+    def get(self, key, build, version=None):
+        # Cached value for key, calling build() on a miss; values must be JSON-serializable
+        path = self._path(key, version)
+        try:
+            with open(path, 'rb') as f:
+                value = loads(f.read())
+        except (OSError, ValueError):
+            pass
+        else:
+            try:
+                # Mark as recently used for eviction
+                os.utime(path)
+            except OSError:
+                pass
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = build()
+        self._write(path, value)
+        self._evict(keep_version=_digest(version)[:16])
+        return value
+
+    def _write(self, path, value):
+        # A failed write leaves the entry missing, to be built again on the next miss
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dumps(value))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, entry.name, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self, keep_version):
+        entries = self._entries()
+        total = sum(size for _, _, _, size in entries)
+        if total <= self.max_bytes:
+            return
+        # Other versions first, then oldest first; stop once back under 90% of the bound
+        entries.sort(key=lambda entry: (entry[1].startswith(keep_version), entry[2]))
+        for path, _, _, size in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for path, _, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, _, _, size in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
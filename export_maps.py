@@ -0,0 +1,139 @@
+import argparse
+import hashlib
+import html
+import os
+import re
+from collections import Counter
+
+import plotly.graph_objects as go
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from map_layers import branch_layer, category_color_map, region_layer
+from map_export import MapBundle
+from warmup import warm_up
+
+# Batch export of the static maps: one Map.html per credit union and per economic region,
+#   <output>/companies/<name>/Map.html, <output>/regions/<name>/Map.html, <output>/index.html
+# The workbook and the regions are loaded once; the pages are then built and written across
+# a process pool. Children are forked (see warmup.py), so they share the loaded data, and
+# every page refers to the one plotly.js and geometry bundle in <output>/map_assets/.
+#
+#   python export_maps.py --output maps --workers 8 --precompress
+
+PROVINCE = '35'  # Ontario
+
+# Set by load_data() before the pool forks
+data = {}
+
+
+def load_data(file_path, province):
+    cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+        file_path, province, hover="Branch: {Branch}, CU: {Name}")
+    data.update(
+        regions=economic_regions,
+        branches=branches_with_regions,
+        branch_index=branch_index,
+        geojson=to_geojson(economic_regions),
+        branch_color_map=category_color_map(cu_branches1['Name'].unique()),
+        region_color_map=category_color_map(economic_regions['ERNAME'].unique()),
+    )
+
+
+def page_slug(name):
+    # Directory-safe name; non-ASCII letters are kept
+    return re.sub(r'[^\w-]+', '_', str(name)).strip('_') or 'unnamed'
+
+
+def page_path(kind, slug):
+    return os.path.join(kind, slug, 'Map.html')
+
+
+def map_jobs():
+    # [(kind, name, page path), ...]
+    branches, regions = data['branches'], data['regions']
+    jobs = []
+    for kind, names in [('companies', branches['Name'].dropna().unique()), ('regions', regions['ERNAME'].unique())]:
+        slugs = [page_slug(name) for name in names]
+        # Names differing only in punctuation or case ("A.B", "A/B", "a b") share a slug,
+        # and would overwrite each other's page; those get a suffix from the name itself,
+        # so each keeps the same path from one export to the next
+        shared = Counter(slug.lower() for slug in slugs)
+        for name, slug in zip(names, slugs):
+            if shared[slug.lower()] > 1:
+                slug = f"{slug}-{hashlib.sha1(str(name).encode('utf-8')).hexdigest()[:8]}"
+            jobs.append((kind, name, page_path(kind, slug)))
+    return jobs
+
+
+def map_figure(kind, name):
+    regions, branches, branch_index = data['regions'], data['branches'], data['branch_index']
+    if kind == 'companies':
+        rows = branch_index.company(name)
+        region_names = set(branches['ERNAME'].iloc[rows].dropna())
+    else:
+        rows = branch_index.region(name)
+        region_names = {name}
+    selected = [i for i, region in enumerate(regions['ERNAME']) if region in region_names]
+    subset = branches.iloc[rows]
+
+    fig = go.Figure(region_layer(regions, data['geojson'], data['region_color_map'], selected=selected))
+    fig.add_trace(branch_layer(subset, data['branch_color_map'], rows=rows))
+    center = {"lat": 50, "lon": -85}
+    if len(subset):
+        center = {"lat": float(subset['Lat'].mean()), "lon": float(subset['Long'].mean())}
+    fig.update_layout(
+        title=f"<b>{html.escape(str(name))}</b>",
+        mapbox_style="open-street-map",
+        mapbox_center=center,
+        mapbox_zoom=5,
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+        showlegend=False,
+    )
+    return fig
+
+
+def export_map(job):
+    kind, name, path = job
+    data['bundle'].write(map_figure(kind, name), path, title=str(name))
+    return path
+
+
+def write_index(bundle, jobs):
+    sections = []
+    for kind, title in [('companies', 'Credit unions'), ('regions', 'Economic regions')]:
+        links = ''.join(f'<li><a href="{path.replace(os.sep, "/")}">{html.escape(str(name))}</a></li>'
+                        for k, name, path in jobs if k == kind)
+        sections.append(f"<h2>{title}</h2><ul>{links}</ul>")
+    os.makedirs(bundle.output_dir, exist_ok=True)
+    with open(os.path.join(bundle.output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Maps</title></head>'
+                f'<body>{"".join(sections)}</body></html>')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export one static map per credit union and economic region")
+    parser.add_argument('--file', default='sherkat.xlsx', help="branch workbook")
+    parser.add_argument('--province', default=PROVINCE)
+    parser.add_argument('--output', default='maps', help="output directory")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument('--geojson', action='store_true', help="store the geometry as GeoJSON, not TopoJSON")
+    parser.add_argument('--minify', action='store_true')
+    parser.add_argument('--precompress', action='store_true', help="write .gz (and .br) copies")
+    args = parser.parse_args(argv)
+
+    load_data(args.file, args.province)
+    bundle = MapBundle(args.output, topology=not args.geojson, minify=args.minify, precompress=args.precompress)
+    data['bundle'] = bundle
+
+    jobs = map_jobs()
+    if jobs:
+        # The first map writes the shared assets before forking, so the children inherit
+        # their names and only reference them
+        export_map(jobs[0])
+        warm_up(jobs[1:], export_map, workers=args.workers, label="maps", name="Export")
+    write_index(bundle, jobs)
+    print(f"Wrote {len(jobs)} maps to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,17 @@
-import geopandas as gpd
-import fiona
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
-
-# Ensure the SHX file is restored if missing or corrupted
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
-
-# Load the economic regions shapefile
-economic_regions = gpd.read_file("ler_000a21a_e.shp")
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from map_export import MapBundle
 
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-# Add hover information
-cu_branches1['hover'] = cu_branches1.apply(lambda x: f"Branch: {x['Branch']}", axis=1)
-
-# Convert branch data to GeoDataFrame
-branches = cu_branches1.copy()
-branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
-branches_gdf = gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
-
-# Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-branches_gdf = branches_gdf.to_crs(economic_regions.crs)
-
-# Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for Ontario (assuming PRUID is the correct column for provinces and '35' is Ontario's code)
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}")
 
 # Prepare GeoJSON for plotting
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
 
 # Create a color map for regions
 unique_regions = economic_regions['ERNAME'].unique()
@@ -61,7 +37,7 @@ fig.update_layout(
 # Plot branches within each region
 for region_name in unique_regions:
     # Filter branches for the current region
-    region_branches = branches_with_regions[branches_with_regions['ERNAME'] == region_name]
+    region_branches = branches_with_regions.iloc[branch_index.region(region_name)]
 
     # Add scatter plot for the branches in the current region
     fig.add_trace(go.Scattermapbox(
@@ -77,5 +53,5 @@ for region_name in unique_regions:
 # Show legend for the scatter plot
 fig.update_layout(showlegend=True, legend_title_text="Economic Region & CU Branches")
 
-# Write the output to an HTML file
-fig.write_html("Map.html")
+# Write the map as a thin page; plotly.js and the geometry are shared in map_assets/
+MapBundle(".").write(fig, "Map.html")
@@ -1,39 +1,16 @@
-import geopandas as gpd
-import fiona
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from map_export import MapBundle
 
-# Ensure the SHX file is restored if missing or corrupted
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
-
-# Load the economic regions shapefile
-economic_regions = gpd.read_file("ler_000a21a_e.shp")
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-cu_branches1['hover'] = cu_branches1.apply(lambda x: f"Branch: {x['Branch']}", axis=1)
-
-# Step 1: Convert branch data to GeoDataFrame
-branches = cu_branches1.copy()
-branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
-branches_gdf = gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
-
-# Step 2: Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-branches_gdf = branches_gdf.to_crs(economic_regions.crs)
-
-# Step 3: Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for Ontario (assuming PRUID is the correct column for provinces and '35' is Ontario's code)
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}")
 
-economic_regions = economic_regions.to_crs(epsg=4326)
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
 
 # Create choropleth mapbox figure for economic regions
 fig = px.choropleth_mapbox(economic_regions,
@@ -54,7 +31,7 @@ unique_names = cu_branches1['Name'].unique()
 color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
 
 for name in unique_names:
-    branch_data = cu_branches1[cu_branches1['Name'] == name]
+    branch_data = cu_branches1.iloc[branch_index.company(name)]
     fig.add_trace(go.Scattermapbox(
         lat=branch_data["Lat"],
         lon=branch_data["Long"],
@@ -74,5 +51,5 @@ fig.update_layout(
     legend_title_text="Economic Region & CU NAME"
 )
 
-# Write the map to an HTML file
-fig.write_html("Map.html")
+# Write the map as a thin page; plotly.js and the geometry are shared in map_assets/
+MapBundle(".").write(fig, "Map.html")
@@ -1,45 +1,19 @@
-import geopandas as gpd
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
+from map_pipeline import load_map_data
+from fast_json import to_geojson
 from dash import Dash, dcc, html, Input, Output
 import dash  # Import dash module
-import fiona
-
-# Ensure the SHX file is restored if missing or corrupted
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
-
-# Load the economic regions shapefile
-economic_regions = gpd.read_file("ler_000a21a_e.shp")
 
 # Load the Excel file containing branches
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-# Add a hover text column
-cu_branches1['hover'] = cu_branches1.apply(lambda x: f"Branch: {x['Branch']}, CU: {x['Name']}", axis=1)
-
-# Convert branch data to GeoDataFrame
-branches = cu_branches1.copy()
-branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
-branches_gdf = gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
-
-# Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-branches_gdf = branches_gdf.to_crs(economic_regions.crs)
-
-# Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for a specific region, e.g., Ontario
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
-economic_regions = economic_regions.to_crs(epsg=4326)
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
 
 # Convert economic regions to GeoJSON for Plotly
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
 
 # Function to create the initial or updated map figure
 def create_map_figure(selected_region_name=None):
@@ -65,12 +39,12 @@ def create_map_figure(selected_region_name=None):
     
     # If a region is selected, only show branches within that region
     if selected_region_name:
-        selected_branches = branches_with_regions[branches_with_regions['ERNAME'] == selected_region_name]
+        selected_branches = branches_with_regions.iloc[branch_index.region(selected_region_name)]
         unique_names = selected_branches['Name'].unique()
         color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
 
         for name in unique_names:
-            branch_data = selected_branches[selected_branches['Name'] == name]
+            branch_data = branches_with_regions.iloc[branch_index.region_company(selected_region_name, name)]
             fig.add_trace(go.Scattermapbox(
                 lat=branch_data["Lat"],
                 lon=branch_data["Long"],
@@ -86,7 +60,7 @@ def create_map_figure(selected_region_name=None):
         color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
         
         for name in unique_names:
-            branch_data = cu_branches1[cu_branches1['Name'] == name]
+            branch_data = cu_branches1.iloc[branch_index.company(name)]
             fig.add_trace(go.Scattermapbox(
                 lat=branch_data["Lat"],
                 lon=branch_data["Long"],
@@ -1,42 +1,20 @@
-import geopandas as gpd
-import fiona
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
+from branch_data import format_columns
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from map_export import MapBundle
 
-# Ensure the SHX file is restored if missing or corrupted
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
-
-# Load the economic regions shapefile
-economic_regions = gpd.read_file("ler_000a21a_e.shp")
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-# Step 1: Convert branch data to GeoDataFrame
-branches = cu_branches1.copy()
-branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
-branches_gdf = gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
-
-# Step 2: Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-branches_gdf = branches_gdf.to_crs(economic_regions.crs)
-
-# Step 3: Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for Ontario (assuming PRUID is the correct column for provinces and '35' is Ontario's code)
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(file_path, PROVINCE, hover=None)
 
 # Add region name to hover information for branch points
-branches_with_regions['hover'] = branches_with_regions.apply(
-    lambda x: f"Branch: {x['Branch']}, Region: {x['ERNAME']}", axis=1
-)
+branches_with_regions['hover'] = format_columns(branches_with_regions, "Branch: {Branch}, Region: {ERNAME}")
 
 # Convert regions to JSON for Plotly
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
 
 # Create choropleth mapbox figure for economic regions
 fig = px.choropleth_mapbox(economic_regions,
@@ -55,7 +33,7 @@ color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Pl
 
 branch_traces = []
 for name in unique_names:
-    branch_data = branches_with_regions[branches_with_regions['Name'] == name]
+    branch_data = branches_with_regions.iloc[branch_index.company(name)]
     trace = go.Scattermapbox(
         lat=branch_data["Lat"],
         lon=branch_data["Long"],
@@ -79,7 +57,6 @@ fig.update_layout(
 
 # Embed JavaScript for interactivity
 custom_js = '''
-<script>
 document.addEventListener("DOMContentLoaded", function() {
     var plot = document.querySelectorAll("div.plotly-graph-div")[0];
 
@@ -135,11 +112,8 @@ document.addEventListener("DOMContentLoaded", function() {
         alert("done");
     });
 });
-</script>
 '''
 
-# Write the map and embed the JavaScript to an HTML file with UTF-8 encoding
-with open("Map.html", "w", encoding="utf-8") as f:
-    f.write(fig.to_html(full_html=False))
-    f.write(custom_js)
-    f.write('</body></html>')
+# Write the map with the JavaScript run after the plot is created; plotly.js and the
+# region geometry go to map_assets/ once, shared by every export
+MapBundle(".").write(fig, "Map.html", script=custom_js)
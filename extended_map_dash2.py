@@ -1,45 +1,23 @@
-import geopandas as gpd
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from figure_cache import FigureCache, args_key
 from dash import Dash, dcc, html, Input, Output
 import dash
-import fiona
-
-# Ensure the SHX file is restored if missing or corrupted
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
-
-# Load the economic regions shapefile
-economic_regions = gpd.read_file("ler_000a21a_e.shp")
 
 # Load the Excel file containing branches
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-# Add a hover text column
-cu_branches1['hover'] = cu_branches1.apply(lambda x: f"Branch: {x['Branch']}, CU: {x['Name']}", axis=1)
-
-# Convert branch data to GeoDataFrame
-branches = cu_branches1.copy()
-branches['geometry'] = branches.apply(lambda x: Point((x['Long'], x['Lat'])), axis=1)
-branches_gdf = gpd.GeoDataFrame(branches, geometry='geometry', crs="EPSG:4326")
-
-# Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-branches_gdf = branches_gdf.to_crs(economic_regions.crs)
-
-# Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for a specific region, e.g., Ontario
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
-economic_regions = economic_regions.to_crs(epsg=4326)
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
 
 # Convert economic regions to GeoJSON for Plotly
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
+
+# Built figures per selection, so the reset view and repeated clicks skip the rebuild
+figure_cache = FigureCache()
 
 # Function to create the initial or updated map figure
 def create_map_figure(selected_region_name=None, visible='legendonly'):
@@ -65,12 +43,12 @@ def create_map_figure(selected_region_name=None, visible='legendonly'):
     fig.update_traces(selector=dict(type='choroplethmapbox'), visible=visible)
 
     if selected_region_name:
-        selected_branches = branches_with_regions[branches_with_regions['ERNAME'] == selected_region_name]
+        selected_branches = branches_with_regions.iloc[branch_index.region(selected_region_name)]
         unique_names = selected_branches['Name'].unique()
         color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
 
         for name in unique_names:
-            branch_data = selected_branches[selected_branches['Name'] == name]
+            branch_data = branches_with_regions.iloc[branch_index.region_company(selected_region_name, name)]
             fig.add_trace(go.Scattermapbox(
                 lat=branch_data["Lat"],
                 lon=branch_data["Long"],
@@ -87,7 +65,7 @@ def create_map_figure(selected_region_name=None, visible='legendonly'):
         color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
 
         for name in unique_names:
-            branch_data = cu_branches1[cu_branches1['Name'] == name]
+            branch_data = cu_branches1.iloc[branch_index.company(name)]
             fig.add_trace(go.Scattermapbox(
                 lat=branch_data["Lat"],
                 lon=branch_data["Long"],
@@ -125,26 +103,32 @@ app.layout = html.Div([
      Input('reset-btn', 'n_clicks')]
 )
 def display_selected_data(clickData, n_clicks):
+    # The region traces themselves change with the selection, so the whole figure is sent
+    selection = selected_figure_args(clickData)
+    return figure_cache.get(args_key(selection), lambda: create_map_figure(*selection))
+
+def selected_figure_args(clickData):
+    # Arguments to create_map_figure() for this click
     ctx = dash.callback_context
 
     if ctx.triggered and ctx.triggered[0]['prop_id'] == 'reset-btn.n_clicks':
-        return create_map_figure()
+        return []
 
     if clickData:
         point_data = clickData['points'][0]
         if 'location' in point_data:
             location_id = point_data['location']
             selected_region_name = economic_regions.loc[location_id, 'ERNAME']
-            return create_map_figure(selected_region_name)
+            return [selected_region_name]
         else:
             lat, lon = point_data['lat'], point_data['lon']
             selected_branch = branches_with_regions[(branches_with_regions['Lat'] == lat) & 
                                                     (branches_with_regions['Long'] == lon)]
             if not selected_branch.empty:
                 selected_region_name = selected_branch.iloc[0]['ERNAME']
-                return create_map_figure(selected_region_name)
+                return [selected_region_name]
     
-    return create_map_figure()
+    return []
 
 if __name__ == '__main__':
     app.run_server(debug=True)
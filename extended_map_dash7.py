@@ -1,37 +1,27 @@
-import geopandas as gpd
-import pandas as pd
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
-from dash import Dash, dcc, html, Input, Output
+from map_pipeline import load_map_data
+from fast_json import to_geojson
+from branch_locator import BranchLocator
+from figure_patch import selection_patch
+from figure_cache import FigureCache, args_key
+from dash import Dash, dcc, html, Input, Output, State
 import dash
-import fiona
-
-# Ensure the SHX file is restored if missing or corrupted, and load the shapefile once
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
 
 # Load the Excel file containing branches
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
-
-# Add hover text and convert branch data to GeoDataFrame in one go
-cu_branches1['geometry'] = [Point(xy) for xy in zip(cu_branches1.Long, cu_branches1.Lat)]
-cu_branches1['hover'] = "Branch: " + cu_branches1['Branch'] + ", CU: " + cu_branches1['Name']
-branches_gdf = gpd.GeoDataFrame(cu_branches1, geometry='geometry', crs="EPSG:4326")
-
-# Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
-
-# Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
-
-# Filter for a specific region, e.g., Ontario
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
+# Resolves branch clicks to their row
+branch_locator = BranchLocator(branches_with_regions)
 
 # Convert economic regions to GeoJSON for Plotly
-geojson = json.loads(economic_regions.to_json())
+geojson = to_geojson(economic_regions)
+
+# Branch traces per selection, so the reset view and repeated clicks skip the rebuild
+trace_cache = FigureCache()
 
 # Function to create the initial or updated map figure
 def create_map_figure(selected_regions=[], selected_company_name=None):
@@ -48,60 +38,76 @@ def create_map_figure(selected_regions=[], selected_company_name=None):
         labels={'ERNAME': 'Economic Region'}
     )
 
-    # Set all regions as deselected
-    fig.update_traces(selector=dict(type='choroplethmapbox'), visible='legendonly')
+    # Set all regions as deselected, except the selected ones
+    for trace, visible in zip(fig.data, region_visibility(selected_regions)):
+        trace.visible = visible
+
+    fig.add_traces(branch_traces(selected_regions, selected_company_name))
+
+    fig.update_layout(
+        title="<b>Map of Ontario's CU branches by Economic Region</b>",
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        showlegend=True,
+        legend_title_text="CU NAME"
+    )
+
+    return fig
+
+def region_visibility(selected_regions=[]):
+    # visible of each region trace; px draws one per region, in economic_regions order
+    return [True if name in selected_regions else 'legendonly' for name in economic_regions['ERNAME']]
+
+def branch_traces(selected_regions=[], selected_company_name=None):
+    # Company traces drawn over the regions
+    traces = []
 
     # Create a color map for all branch names
     unique_names = cu_branches1['Name'].unique()
     color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
 
     # Remove existing legends with the same name before adding new ones
-    def remove_existing_legends(fig, name):
-        fig.data = tuple(trace for trace in fig.data if trace.name != name)
+    def remove_existing_legends(traces, name):
+        traces[:] = [trace for trace in traces if trace.name != name]
 
     for name in unique_names:
-        remove_existing_legends(fig, name)
-        branch_data = cu_branches1[cu_branches1['Name'] == name]
-        fig.add_trace(go.Scattermapbox(
+        remove_existing_legends(traces, name)
+        rows = branch_index.company(name)
+        branch_data = cu_branches1.iloc[rows]
+        traces.append(go.Scattermapbox(
             lat=branch_data["Lat"],
             lon=branch_data["Long"],
             mode='markers',
             marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
             name=name,
             text=branch_data["hover"],
+            customdata=rows,  # Row position, resolved on click
             hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
             legendgroup=name,
             showlegend=True,
             visible='legendonly'  # Set initial visibility to 'legendonly' for all branches
         ))
 
-    fig.update_layout(
-        title="<b>Map of Ontario's CU branches by Economic Region</b>",
-        margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        showlegend=True,
-        legend_title_text="CU NAME"
-    )
-
     if len(selected_regions) > 0:
-        # Highlight each selected region
-        for region in selected_regions:
-            region_index = economic_regions[economic_regions['ERNAME'] == region].index
-            if not region_index.empty:
-                fig.update_traces(selector=dict(locations=[region_index[0]]), visible=True)
+        # The selected regions are highlighted in create_map_figure(); the branches
+        # below are those of the last one
+        region = selected_regions[-1]
 
         if selected_company_name:
-            selected_branches = branches_with_regions[branches_with_regions['Name'] == selected_company_name]
+            selected_rows = branch_index.company(selected_company_name)
             for name in unique_names:
-                branch_data = selected_branches[selected_branches['Name'] == name]
+                # Every selected row belongs to the selected company
+                rows = selected_rows if name == selected_company_name else selected_rows[:0]
+                branch_data = branches_with_regions.iloc[rows]
                 if not branch_data.empty:
-                    remove_existing_legends(fig, name)
-                    fig.add_trace(go.Scattermapbox(
+                    remove_existing_legends(traces, name)
+                    traces.append(go.Scattermapbox(
                         lat=branch_data["Lat"],
                         lon=branch_data["Long"],
                         mode='markers',
                         marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
                         name=name,
                         text=branch_data["hover"],
+                        customdata=rows,  # Row position, resolved on click
                         hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
                         legendgroup=name,
                         showlegend=True,
@@ -109,25 +115,26 @@ def create_map_figure(selected_regions=[], selected_company_name=None):
                     ))
 
         else:
-            selected_branches = branches_with_regions[branches_with_regions['ERNAME'] == region]
             for name in unique_names:
-                branch_data = selected_branches[selected_branches['Name'] == name]
+                rows = branch_index.region_company(region, name)
+                branch_data = branches_with_regions.iloc[rows]
                 if not branch_data.empty:
-                    remove_existing_legends(fig, name)
-                    fig.add_trace(go.Scattermapbox(
+                    remove_existing_legends(traces, name)
+                    traces.append(go.Scattermapbox(
                         lat=branch_data["Lat"],
                         lon=branch_data["Long"],
                         mode='markers',
                         marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
                         name=name,
                         text=branch_data["hover"],
+                        customdata=rows,  # Row position, resolved on click
                         hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
                         legendgroup=name,
                         showlegend=True,
                         visible=True  # Highlight the legend for branches in the selected region
                     ))
 
-    return fig
+    return traces
 
 # Initialize the Dash app
 app = Dash(__name__)
@@ -135,19 +142,30 @@ app = Dash(__name__)
 app.layout = html.Div([
     dcc.Graph(id='map', figure=create_map_figure(),
               style={"height": "95vh"}),
-    html.Button('Reset Map', id='reset-btn', n_clicks=0)
+    html.Button('Reset Map', id='reset-btn', n_clicks=0),
+    # Branch traces after the regions in the browser's figure
+    dcc.Store(id='branch-traces', data=len(branch_traces()))
 ])
 
 @app.callback(
     Output('map', 'figure'),
+    Output('branch-traces', 'data'),
     [Input('map', 'clickData'),
-     Input('reset-btn', 'n_clicks')]
+     Input('reset-btn', 'n_clicks')],
+    State('branch-traces', 'data')
 )
-def display_selected_data(clickData, n_clicks):
+def display_selected_data(clickData, n_clicks, old_count):
+    # Patch the region visibility and the branch traces for the new selection
+    new_selection = selected_figure_args(clickData)
+    traces = trace_cache.get(args_key(new_selection), lambda: branch_traces(*new_selection))
+    return selection_patch(region_visibility(*new_selection[:1]), old_count, traces), len(traces)
+
+def selected_figure_args(clickData):
+    # Arguments to create_map_figure() for this click
     ctx = dash.callback_context
 
     if ctx.triggered and ctx.triggered[0]['prop_id'] == 'reset-btn.n_clicks':
-        return create_map_figure()
+        return []
 
     if clickData:
         selected_regions = []
@@ -155,19 +173,17 @@ def display_selected_data(clickData, n_clicks):
         if 'location' in point_data:
             location_id = point_data['location']
             selected_regions.append(economic_regions.loc[location_id, 'ERNAME'])
-            return create_map_figure(selected_regions)
+            return [selected_regions]
         else:
-            lat, lon = point_data['lat'], point_data['lon']
-            selected_branch = branches_with_regions[(branches_with_regions['Lat'] == lat) & 
-                                                    (branches_with_regions['Long'] == lon)]
-            if not selected_branch.empty:
-                selected_region_name = selected_branch.iloc[0]['ERNAME']
-                selected_company_name = selected_branch.iloc[0]['Name']
-                selected_branches = branches_with_regions[branches_with_regions['Name'] == selected_company_name]
+            # Exact row from the marker's customdata, nearest branch otherwise
+            row = branch_locator.resolve(point_data)
+            if row is not None:
+                selected_company_name = branches_with_regions['Name'].iloc[row]
+                selected_branches = branches_with_regions.iloc[branch_index.company(selected_company_name)]
                 selected_regions.extend(selected_branches['ERNAME'].unique())
-                return create_map_figure(selected_regions, selected_company_name)
+                return [selected_regions, selected_company_name]
     
-    return create_map_figure()
+    return []
 
 if __name__ == '__main__':
     app.run_server(debug=True)
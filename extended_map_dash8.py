@@ -1,61 +1,202 @@
-import geopandas as gpd
-import pandas as pd
+import numpy as np
 import plotly.express as px
-import json
 import plotly.graph_objects as go
-from shapely.geometry import Point
-from dash import Dash, dcc, html, Input, Output
+from branch_data import branches_version
+from map_pipeline import load_map_data
+from fast_json import COORDINATE_PRECISION, Fragments, dumps, to_geojson
+from branch_locator import BranchLocator
+from map_layers import branch_layer, category_color_map, color_legend, highlight_lookup, legend_panel, region_layer
+from map_viewport import DEFAULT_VIEW, GridIndex, padded_bounds, update_view, view_bounds
+from region_store import DETAIL_LEVELS, level_for_zoom, load_region_levels, regions_version
+from topology import QUANTIZATION, encode_topology
+from static_geometry import GeometryStore
+from figure_patch import figure_patch, plain_figure
+from figure_cache import FigureCache
+from disk_cache import DiskCache
+from warmup import warm_up
+from data_cache import CACHE_DIR
+import os
+from flask import jsonify
+from dash import Dash, dcc, html, Input, Output, State, Patch, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash
-import fiona
-
-# Ensure the SHX file is restored if missing or corrupted, and load the shapefile once
-with fiona.Env(SHAPE_RESTORE_SHX='YES'):
-    economic_regions = gpd.read_file("ler_000a21a_e.shp")
 
 # Load the Excel file containing branches
 file_path = 'sherkat.xlsx'
-cu_branches1 = pd.read_excel(file_path)
+PROVINCE = '35'  # Ontario
+# Load the branches and link them to the province's economic regions
+cu_branches1, economic_regions, branches_with_regions, branch_index = load_map_data(
+    file_path, PROVINCE, hover="Branch: {Branch}, CU: {Name}")
+# Resolves branch clicks to their row
+branch_locator = BranchLocator(branches_with_regions)
 
-# Add hover text and convert branch data to GeoDataFrame in one go
-cu_branches1['geometry'] = [Point(xy) for xy in zip(cu_branches1.Long, cu_branches1.Lat)]
-cu_branches1['hover'] = "Branch: " + cu_branches1['Branch'] + ", CU: " + cu_branches1['Name']
-branches_gdf = gpd.GeoDataFrame(cu_branches1, geometry='geometry', crs="EPSG:4326")
+# Convert economic regions to GeoJSON for Plotly
+geojson = to_geojson(economic_regions)
 
-# Ensure CRS matches
-economic_regions = economic_regions.to_crs(epsg=4326)
+# Figures and GeoJSON shared on disk between worker processes, keyed by dataset version
+disk_cache = DiskCache(os.path.join(CACHE_DIR, 'figures'), max_bytes=512 * 1024 * 1024)
 
-# Spatial join to link branches to regions
-branches_with_regions = gpd.sjoin(branches_gdf, economic_regions, how="left", predicate="within")
+# Draw all branches as one marker trace coloured per point, with the company legend
+# rendered beside the map; set to False for the one-trace-per-company figure
+SINGLE_TRACE_BRANCHES = True
 
-# Filter for a specific region, e.g., Ontario
-economic_regions = economic_regions[economic_regions['PRUID'] == '35']
+# Send only the branches inside the map view, plus VIEW_MARGIN of its size on each side,
+# and stream the rest in as the map is panned or zoomed, so the payload follows what is
+# on screen rather than the size of the branch table; needs the single branch trace,
+# with the region layer in either form
+VIEWPORT_BRANCHES = SINGLE_TRACE_BRANCHES
+VIEW_MARGIN = 0.5
 
-# Convert economic regions to GeoJSON for Plotly
-geojson = json.loads(economic_regions.to_json())
+# Draw all regions as one choropleth trace so the GeoJSON is embedded only once;
+# set to False for the one-trace-per-region figure from px.choropleth_mapbox
+SINGLE_TRACE_REGIONS = True
+
+# Apply region/company highlighting in the browser (assets/map_highlight.js) instead of
+# a server callback; needs both single-trace layers
+CLIENTSIDE_HIGHLIGHT = SINGLE_TRACE_BRANCHES and SINGLE_TRACE_REGIONS
+
+# Send every outline level once in the layout as quantized TopoJSON and decode it in the
+# browser (assets/region_outlines.js) instead of patching GeoJSON in from the server on
+# zoom; opt in with MAP_TOPOLOGY_OUTLINES=1 where the static files below can't be served
+TOPOLOGY_OUTLINES = SINGLE_TRACE_REGIONS and os.environ.get('MAP_TOPOLOGY_OUTLINES') == '1'
+
+# Otherwise publish the outline levels as content-hashed static files (static_geometry.py)
+# and put only their URLs in the figures, so browsers download and cache each level once
+GEOMETRY_URLS = SINGLE_TRACE_REGIONS and not TOPOLOGY_OUTLINES
+
+# Simplified region outlines per zoom level, for the single region trace; the map starts
+# at zoom 5 and swaps in finer outlines as the user zooms in. The per-region traces keep
+# the full-detail GeoJSON above
+region_geojson_levels = disk_cache.get(
+    ('region-geojson-levels', PROVINCE, COORDINATE_PRECISION),
+    lambda: [to_geojson(level) for level in load_region_levels(province=PROVINCE)],
+    regions_version(PROVINCE)
+) if SINGLE_TRACE_REGIONS else []
+DEFAULT_LEVEL = level_for_zoom(5)
+
+# Cached figures refer to the outline levels by name rather than holding a copy
+fragments = Fragments()
+for level, level_geojson in enumerate(region_geojson_levels):
+    fragments.add(f"regions-lod{level}", level_geojson)
+
+geometry_store = GeometryStore(os.path.join(CACHE_DIR, 'geometry'))
+region_min_zoom = [min_zoom for min_zoom, _ in DETAIL_LEVELS]
+if GEOMETRY_URLS:
+    region_geometry = [
+        geometry_store.url(geometry_store.publish(f"regions-{PROVINCE}-lod{level}", dumps(level_geojson)))
+        for level, level_geojson in enumerate(region_geojson_levels)
+    ]
+    region_outlines = {'min_zoom': region_min_zoom, 'urls': region_geometry}
+else:
+    region_geometry = region_geojson_levels
+    region_outlines = disk_cache.get(
+        ('region-topology', PROVINCE, QUANTIZATION),
+        lambda: {
+            'name': 'regions',
+            'min_zoom': region_min_zoom,
+            'levels': [encode_topology(level) for level in load_region_levels(province=PROVINCE)],
+        },
+        regions_version(PROVINCE)
+    ) if TOPOLOGY_OUTLINES else None
+
+# Branch rows bucketed by location, for the branches in a view
+branch_grid = GridIndex(cu_branches1['Lat'], cu_branches1['Long'])
 
-selected_regions = set()
+# Create color maps for all branch names and regions
+branch_color_map = category_color_map(cu_branches1['Name'].unique())
+region_color_map = category_color_map(economic_regions['ERNAME'].unique())
+region_positions = {name: i for i, name in enumerate(economic_regions['ERNAME'])}
+
+# Built figures by selection for the server-side highlight (CLIENTSIDE_HIGHLIGHT off),
+# where every click looks up two; with the clientside highlight only the initial figure
+# is read. The version ties them to the loaded workbook and regions
+DATA_VERSION = f"{branches_version(file_path)}-{regions_version(PROVINCE)}"
+FIGURE_CACHE_SIZE = 256
+# Disk-cached figures outlive restarts, so their key carries the figure format and every
+# setting that shapes the figure; bump FIGURE_FORMAT whenever create_map_figure() changes
+FIGURE_FORMAT = 1
+FIGURE_SETTINGS = (FIGURE_FORMAT, SINGLE_TRACE_BRANCHES, SINGLE_TRACE_REGIONS, GEOMETRY_URLS, VIEWPORT_BRANCHES,
+                   VIEW_MARGIN)
+figure_cache = FigureCache(FIGURE_CACHE_SIZE)
+
+def highlight_regions(fig, selected_regions):
+    if SINGLE_TRACE_REGIONS:
+        # Already applied through the region layer's selectedpoints
+        return
+    for region in selected_regions:
+        region_index = economic_regions[economic_regions['ERNAME'] == region].index
+        if not region_index.empty:
+            fig.update_traces(selector=dict(locations=[region_index[0]]), visible=True)
+
+def highlighted_positions(selected_regions, selected_company_name):
+    if not selected_regions:
+        return None
+    if selected_company_name:
+        return branch_index.company(selected_company_name)
+    return branch_index.select(regions=selected_regions)
+
+def branch_bounds(view):
+    # Bounds of the branches to send for a view: the view itself plus the margin
+    return padded_bounds(view_bounds(view), VIEW_MARGIN)
+
+def view_branch_layer(bounds, selected_regions=None, selected_company_name=None):
+    # Branch layer holding only the branches within bounds; customdata keeps their row
+    # ids, so clicks and highlighting still name rows of the full table
+    rows = branch_grid.query(bounds)
+    highlighted = highlighted_positions(selected_regions, selected_company_name)
+    selected = None if highlighted is None else np.flatnonzero(np.isin(rows, highlighted))
+    return branch_layer(cu_branches1.iloc[rows], branch_color_map, selected=selected, rows=rows)
 
 # Function to create the initial or updated map figure
 def create_map_figure(selected_regions=None, selected_company_name=None):
-    # Base map figure with all regions
-    fig = px.choropleth_mapbox(
-        economic_regions,
-        geojson=geojson,
-        locations=economic_regions.index,
-        color="ERNAME",
-        center={"lat": 50, "lon": -85},
-        mapbox_style="open-street-map",
-        zoom=5,
-        opacity=0.5,
-        labels={'ERNAME': 'Economic Region'}
-    )
+    if SINGLE_TRACE_REGIONS:
+        # Base map figure with all regions in one trace, selected regions highlighted
+        selected = [region_positions[region] for region in selected_regions or [] if region in region_positions]
+        fig = go.Figure(region_layer(economic_regions, region_geometry[DEFAULT_LEVEL], region_color_map,
+                                     selected=selected))
+        fig.update_layout(
+            mapbox_style="open-street-map",
+            mapbox_center={"lat": 50, "lon": -85},
+            mapbox_zoom=5,
+            # Keep the user's view when the selection changes
+            uirevision='map'
+        )
+    else:
+        # Base map figure with all regions
+        fig = px.choropleth_mapbox(
+            economic_regions,
+            geojson=geojson,
+            locations=economic_regions.index,
+            color="ERNAME",
+            center={"lat": 50, "lon": -85},
+            mapbox_style="open-street-map",
+            zoom=5,
+            opacity=0.5,
+            labels={'ERNAME': 'Economic Region'}
+        )
 
-    # Set all regions as deselected
-    fig.update_traces(selector=dict(type='choroplethmapbox'), visible='legendonly')
+        # Set all regions as deselected
+        fig.update_traces(selector=dict(type='choroplethmapbox'), visible='legendonly')
+
+    if SINGLE_TRACE_BRANCHES:
+        highlight_regions(fig, selected_regions or [])
+        if VIEWPORT_BRANCHES:
+            fig.add_trace(view_branch_layer(branch_bounds(DEFAULT_VIEW), selected_regions, selected_company_name))
+        else:
+            fig.add_trace(branch_layer(
+                cu_branches1, branch_color_map,
+                selected=highlighted_positions(selected_regions, selected_company_name),
+            ))
+        fig.update_layout(
+            title="<b>Map of Ontario's CU branches by Economic Region</b>",
+            margin={"r": 0, "t": 0, "l": 0, "b": 0},
+            showlegend=True,
+            legend_title_text="Economic Region"
+        )
+        return fig
 
-    # Create a color map for all branch names
     unique_names = cu_branches1['Name'].unique()
-    color_map = {name: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, name in enumerate(unique_names)}
+    color_map = branch_color_map
 
     # Remove existing legends with the same name before adding new ones
     def remove_existing_legends(fig, name):
@@ -63,7 +204,8 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
 
     for name in unique_names:
         remove_existing_legends(fig, name)
-        branch_data = cu_branches1[cu_branches1['Name'] == name]
+        rows = branch_index.company(name)
+        branch_data = cu_branches1.iloc[rows]
         fig.add_trace(go.Scattermapbox(
             lat=branch_data["Lat"],
             lon=branch_data["Long"],
@@ -71,6 +213,7 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
             marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
             name=name,
             text=branch_data["hover"],
+            customdata=rows,  # Row position, resolved on click
             hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
             legendgroup=name,
             showlegend=True,
@@ -86,15 +229,14 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
 
     if selected_regions:
         # Highlight each selected region
-        for region in selected_regions:
-            region_index = economic_regions[economic_regions['ERNAME'] == region].index
-            if not region_index.empty:
-                fig.update_traces(selector=dict(locations=[region_index[0]]), visible=True)
+        highlight_regions(fig, selected_regions)
 
         if selected_company_name:
-            selected_branches = branches_with_regions[branches_with_regions['Name'] == selected_company_name]
+            selected_rows = branch_index.company(selected_company_name)
             for name in unique_names:
-                branch_data = selected_branches[selected_branches['Name'] == name]
+                # Every selected row belongs to the selected company
+                rows = selected_rows if name == selected_company_name else selected_rows[:0]
+                branch_data = branches_with_regions.iloc[rows]
                 if not branch_data.empty:
                     remove_existing_legends(fig, name)
                     fig.add_trace(go.Scattermapbox(
@@ -104,6 +246,7 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
                         marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
                         name=name,
                         text=branch_data["hover"],
+                        customdata=rows,  # Row position, resolved on click
                         hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
                         legendgroup=name,
                         showlegend=True,
@@ -111,9 +254,9 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
                     ))
 
         else:
-            selected_branches = branches_with_regions[branches_with_regions['ERNAME'].isin(selected_regions)]
             for name in unique_names:
-                branch_data = selected_branches[selected_branches['Name'] == name]
+                rows = branch_index.select(regions=selected_regions, companies=[name])
+                branch_data = branches_with_regions.iloc[rows]
                 if not branch_data.empty:
                     remove_existing_legends(fig, name)
                     fig.add_trace(go.Scattermapbox(
@@ -123,6 +266,7 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
                         marker=go.scattermapbox.Marker(size=10, color=color_map[name]),
                         name=name,
                         text=branch_data["hover"],
+                        customdata=rows,  # Row position, resolved on click
                         hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
                         legendgroup=name,
                         showlegend=True,
@@ -131,46 +275,213 @@ def create_map_figure(selected_regions=None, selected_company_name=None):
 
     return fig
 
+def selection_key(selected_regions=None, selected_company_name=None):
+    # The company only matters once regions are selected
+    regions = tuple(sorted(set(selected_regions or []), key=str))
+    return (regions, selected_company_name if regions else None)
+
+def packed_map_figure(key):
+    # Through the disk cache other workers fill, with the region outlines stored by reference
+    def build():
+        figure = plain_figure(create_map_figure(*key))
+        if SINGLE_TRACE_REGIONS and not GEOMETRY_URLS:
+            figure['data'][0]['geojson'] = fragments.ref(f"regions-lod{DEFAULT_LEVEL}")
+        return figure
+    return disk_cache.get(('map-figure',) + FIGURE_SETTINGS + key, build, DATA_VERSION)
+
+def cached_map_figure(selected_regions=None, selected_company_name=None):
+    # Every cached figure shares the one in-memory copy of the outlines
+    key = selection_key(selected_regions, selected_company_name)
+    return figure_cache.get(key, lambda: fragments.resolve(packed_map_figure(key)), DATA_VERSION)
+
+# Optional warm-up (MAP_WARMUP=1): build the figure for every single region click and
+# every company click before serving, so no first click pays the build cost. Only the
+# server-side highlight reads those figures, so with CLIENTSIDE_HIGHLIGHT the setting
+# is ignored rather than spending startup time and memory on figures nothing serves
+WARM_UP = os.environ.get('MAP_WARMUP') == '1' and not CLIENTSIDE_HIGHLIGHT
+if os.environ.get('MAP_WARMUP') == '1' and not WARM_UP:
+    print("MAP_WARMUP=1 ignored: the figure warm-up only applies with CLIENTSIDE_HIGHLIGHT off")
+warmed_up = False
+
+def warm_up_selections():
+    yield selection_key()
+    for region in economic_regions['ERNAME']:
+        yield selection_key([region])
+    for company in branch_index.by_company:
+        regions = branches_with_regions['ERNAME'].iloc[branch_index.company(company)].dropna().unique()
+        yield selection_key(regions, company)
+
+def warm_up_figures(workers=None):
+    global warmed_up
+    for key, figure in warm_up(warm_up_selections(), packed_map_figure, workers, label="figures"):
+        figure_cache.put(key, fragments.resolve(figure), DATA_VERSION)
+    warmed_up = True
+
+# Legends for the layers drawn as single traces
+legends = []
+if SINGLE_TRACE_REGIONS:
+    legends.append(color_legend(region_color_map, "Economic Region"))
+if SINGLE_TRACE_BRANCHES:
+    legends.append(color_legend(branch_color_map, "CU NAME"))
+legends = [legend_panel(*legends)] if legends else []
+
 # Initialize the Dash app
 app = Dash(__name__)
+server = app.server  # WSGI entry point, see wsgi.py
+geometry_store.register(server)
+
+@server.route('/healthz')
+def healthz():
+    # Ready once the warm-up (if enabled) has filled the figure cache
+    ready = warmed_up or not WARM_UP
+    return jsonify({'ready': ready, 'figure_cache': figure_cache.stats()}), 200 if ready else 503
+
+@server.route('/stats/figure-cache')
+def figure_cache_stats():
+    return jsonify(figure_cache.stats())
+
+@server.route('/stats/disk-cache')
+def disk_cache_stats():
+    return jsonify(disk_cache.stats())
+
+# The branch layer is added after the region traces, one or one per region, so its
+# index comes from the built figure rather than from the layer flags
+initial_figure = cached_map_figure()
+BRANCH_TRACE = len(initial_figure['data']) - 1
 
 app.layout = html.Div([
-    dcc.Graph(id='map', figure=create_map_figure(),
-              style={"height": "95vh"}),
-    html.Button('Reset Map', id='reset-btn', n_clicks=0)
+    html.Div([
+        dcc.Graph(id='map', figure=initial_figure,
+                  style={"height": "95vh"}),
+    ] + legends,
+        style={"position": "relative"}),
+    html.Button('Reset Map', id='reset-btn', n_clicks=0),
+    dcc.Store(id='region-level', data=DEFAULT_LEVEL),
+    dcc.Store(id='region-outlines', data=region_outlines),
+    dcc.Store(id='selection', data=[]),
+    dcc.Store(id='branch-trace', data=BRANCH_TRACE),
+    dcc.Store(id='view', data=DEFAULT_VIEW),
+    dcc.Store(id='branch-bounds', data=branch_bounds(DEFAULT_VIEW)),
+    dcc.Store(id='highlight-lookup',
+              data=highlight_lookup(economic_regions, branches_with_regions, branch_index) if CLIENTSIDE_HIGHLIGHT else None)
 ])
 
-@app.callback(
-    Output('map', 'figure'),
-    [Input('map', 'clickData'),
-     Input('reset-btn', 'n_clicks')]
-)
-def display_selected_data(clickData, n_clicks):
-    global selected_regions
+def update_viewport(relayoutData, view, sent):
+    # Track the view; the branch bounds move only once the view leaves the bounds
+    # already sent, or zooms in far enough that they hold mostly off-screen branches,
+    # so pans within the margin send nothing
+    view = update_view(relayoutData, view)
+    if view is None:
+        raise PreventUpdate
+    bounds = branch_bounds(view)
+    west, south, east, north = view_bounds(view)
+    if (sent and sent[0] <= west and sent[1] <= south and east <= sent[2] and north <= sent[3]
+            and (sent[2] - sent[0]) < 2 * (bounds[2] - bounds[0])):
+        return view, dash.no_update
+    return view, bounds
+
+def stream_branches(bounds, selection):
+    # Replace the branch layer with the branches within the new bounds
+    patch = Patch()
+    patch['data'][BRANCH_TRACE] = view_branch_layer(bounds, *selection)
+    return patch
+
+def display_selected_data(clickData, n_clicks, selection, bounds):
+    # Send only what changed between the previous and the new selection's figure
+    new_selection = selected_figure_args(clickData, selection)
+    figure = figure_patch(cached_map_figure(*selection), cached_map_figure(*new_selection))
+    if VIEWPORT_BRANCHES:
+        # The cached figures hold the default view's branches; send the current view's
+        layer = view_branch_layer(bounds, *new_selection).to_plotly_json()
+        if isinstance(figure, Patch):
+            figure['data'][BRANCH_TRACE] = layer
+        else:
+            data = list(figure['data'])
+            data[BRANCH_TRACE] = layer
+            figure = dict(figure, data=data)
+    return figure, new_selection
+
+def selected_figure_args(clickData, selection):
+    # Arguments to create_map_figure() for this click, given the session's current ones.
+    # Selection state lives only in the browser's 'selection' store, so any worker can serve the click
     ctx = dash.callback_context
 
     if ctx.triggered and ctx.triggered[0]['prop_id'] == 'reset-btn.n_clicks':
-        return create_map_figure()
+        return []
 
     if clickData:
+        selected_regions = set(selection[0]) if selection else set()
         point_data = clickData['points'][0]
         if 'location' in point_data:
             location_id = point_data['location']
             selected_regions.add(economic_regions.loc[location_id, 'ERNAME'])
-            return create_map_figure(selected_regions)
+            return [sorted(selected_regions, key=str)]
         else:
-            lat, lon = point_data['lat'], point_data['lon']
-            selected_branch = branches_with_regions[(branches_with_regions['Lat'] == lat) & 
-                                                    (branches_with_regions['Long'] == lon)]
-            if not selected_branch.empty:
-                selected_region_name = selected_branch.iloc[0]['ERNAME']
-                selected_company_name = selected_branch.iloc[0]['Name']
-                selected_branches = branches_with_regions[branches_with_regions['Name'] == selected_company_name]
-                for ername in selected_branches['ERNAME'].unique():
+            # Exact row from the marker's customdata, nearest branch otherwise
+            row = branch_locator.resolve(point_data)
+            if row is not None:
+                selected_company_name = branches_with_regions['Name'].iloc[row]
+                selected_branches = branches_with_regions.iloc[branch_index.company(selected_company_name)]
+                for ername in selected_branches['ERNAME'].dropna().unique():
                     selected_regions.add(ername)
-                return create_map_figure(selected_regions, selected_company_name)
+                return [sorted(selected_regions, key=str), selected_company_name]
     
-    return create_map_figure()
+    return []
+
+# Outline levels only exist for the single region trace; the per-region traces keep
+# their full-detail GeoJSON, so zooming them needs no callback
+if GEOMETRY_URLS or TOPOLOGY_OUTLINES:
+    app.clientside_callback(
+        ClientsideFunction(namespace='map', function_name='regionOutlines'),
+        Output('map', 'figure', allow_duplicate=True),
+        Output('region-level', 'data'),
+        Input('map', 'relayoutData'),
+        State('region-level', 'data'),
+        State('region-outlines', 'data'),
+        State('map', 'figure'),
+        prevent_initial_call=True
+    )
+
+if VIEWPORT_BRANCHES:
+    # Two steps, as the region outline callback may already patch the figure on relayoutData
+    app.callback(
+        Output('view', 'data'),
+        Output('branch-bounds', 'data'),
+        Input('map', 'relayoutData'),
+        State('view', 'data'),
+        State('branch-bounds', 'data'),
+        prevent_initial_call=True
+    )(update_viewport)
+    app.callback(
+        Output('map', 'figure', allow_duplicate=True),
+        Input('branch-bounds', 'data'),
+        State('selection', 'data'),
+        prevent_initial_call=True
+    )(stream_branches)
+
+if CLIENTSIDE_HIGHLIGHT:
+    app.clientside_callback(
+        ClientsideFunction(namespace='map', function_name='highlight'),
+        Output('map', 'figure'),
+        Output('selection', 'data'),
+        [Input('map', 'clickData'),
+         Input('reset-btn', 'n_clicks')],
+        State('highlight-lookup', 'data'),
+        State('selection', 'data'),
+        State('map', 'figure'),
+        State('branch-trace', 'data')
+    )
+else:
+    app.callback(
+        Output('map', 'figure'),
+        Output('selection', 'data'),
+        [Input('map', 'clickData'),
+         Input('reset-btn', 'n_clicks')],
+        State('selection', 'data'),
+        State('branch-bounds', 'data')
+    )(display_selected_data)
 
 if __name__ == '__main__':
+    if WARM_UP:
+        warm_up_figures()
     app.run_server(debug=True)
@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import shapely
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback; same output, slower
+    orjson = None
+
+# JSON encoding for figures and region GeoJSON.
+# geojson_bytes() writes a FeatureCollection straight from the shapely coordinate
+# arrays, rounded to COORDINATE_PRECISION decimals, instead of going through
+# GeoDataFrame.to_json() and back through json.loads(). Fragments holds large static
+# values (the region GeoJSON) by name, so figures cached on disk store a short reference
+# in their place and every figure resolved from them shares the one in-memory copy.
+
+COORDINATE_PRECISION = 6  # decimal degrees, about 0.1 m
+
+POLYGON = 3
+MULTIPOLYGON = 6
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':'), default=_plain_value).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _plain_value(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _split(values, offsets):
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def _geometries(geoms, precision):
+    # GeoJSON geometry dicts holding rounded numpy coordinate arrays
+    types = shapely.get_type_id(geoms)
+    if not np.isin(types, [POLYGON, MULTIPOLYGON]).all():
+        # Collections from make_valid() and other mixed shapes take the generic path
+        rounded = shapely.transform(geoms, lambda coords: np.round(coords, precision))
+        return [shapely.geometry.mapping(geom) if geom is not None else None for geom in rounded]
+
+    _, coords, offsets = shapely.to_ragged_array(geoms)
+    rings = _split(np.round(coords, precision), offsets[0])
+    if len(offsets) == 2:
+        # All plain polygons
+        polygons, parts = _split(rings, offsets[1]), None
+    else:
+        polygons = _split(rings, offsets[1])
+        parts = _split(polygons, offsets[2])
+    result = []
+    for i, type_id in enumerate(types):
+        if parts is None:
+            result.append({'type': 'Polygon', 'coordinates': polygons[i]})
+        elif type_id == POLYGON:
+            result.append({'type': 'Polygon', 'coordinates': parts[i][0]})
+        else:
+            result.append({'type': 'MultiPolygon', 'coordinates': parts[i]})
+    return result
+
+
+def geojson_bytes(gdf, precision=COORDINATE_PRECISION):
+    # Same FeatureCollection layout as gdf.to_json(): id is the index label, every
+    # other column is a property
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict('records')
+    geometries = _geometries(gdf.geometry.values, precision)
+    features = [
+        {'id': str(label), 'type': 'Feature', 'properties': props, 'geometry': geometry}
+        for label, props, geometry in zip(gdf.index, properties, geometries)
+    ]
+    return dumps({'type': 'FeatureCollection', 'features': features})
+
+
+def to_geojson(gdf, precision=COORDINATE_PRECISION):
+    # Drop-in for json.loads(gdf.to_json())
+    return loads(geojson_bytes(gdf, precision))
+
+
+class Fragments:
+    # Named static values, shared by every figure that uses them
+
+    def __init__(self):
+        self.values = {}
+
+    def add(self, name, value):
+        self.values[name] = value
+        return value
+
+    def ref(self, name):
+        return {'$fragment': name}
+
+    def _is_ref(self, value):
+        return isinstance(value, dict) and len(value) == 1 and value.get('$fragment') in self.values
+
+    def resolve(self, figure):
+        # Figure with the references in its traces and layout replaced by the shared values
+        def swap(part):
+            return {key: self.values[value['$fragment']] if self._is_ref(value) else value for key, value in part.items()}
+        resolved = dict(figure)
+        resolved['data'] = [swap(trace) for trace in figure.get('data', [])]
+        if 'layout' in figure:
+            resolved['layout'] = swap(figure['layout'])
+        return resolved
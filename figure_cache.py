@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+# Bounded in-process LRU of built figures.
+# Entries are keyed by a canonical selection and tagged with the dataset version they
+# were built from; a lookup with a different version empties the cache first, so a
+# reload of the branches or regions never serves a stale figure.
+# The older scripts cache per callback arguments, keyed with args_key().
+
+
+def args_key(args):
+    # Hashable key for create_map_figure()-style arguments; lists become tuples
+    return tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+
+
+class FigureCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _use_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key, build, version=None):
+        # Cached value for key, calling build() on a miss
+        with self._lock:
+            self._use_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Build outside the lock; concurrent misses on one key just build it twice
+        value = build()
+        with self._lock:
+            if version == self.version:
+                self._store(key, value)
+        return value
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._use_version(version)
+            self._store(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'version': self.version,
+            }
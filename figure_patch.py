@@ -0,0 +1,57 @@
+import plotly.io as pio
+from dash import Patch
+
+from fast_json import dumps, loads
+
+# Partial figure updates for the Dash callbacks.
+# figure_patch() diffs two built figures and sends the browser only the trace and
+# layout properties that differ; it suits figures that are cached anyway (dash8).
+# selection_patch() builds the patch straight from the selection for the per-company
+# scripts, whose region traces only change visibility, so a click builds neither the
+# old nor the new figure.
+
+
+def plain_figure(fig):
+    # Plain JSON values, so numpy arrays and lists compare equal; dicts are taken as already plain
+    if isinstance(fig, dict):
+        return fig
+    return loads(pio.to_json(fig, validate=False))
+
+
+def _diff(patch, old, new):
+    for key in old.keys() - new.keys():
+        del patch[key]
+    for key, value in new.items():
+        if old.get(key) != value:
+            patch[key] = value
+
+
+def figure_patch(old_fig, new_fig):
+    old, new = plain_figure(old_fig), plain_figure(new_fig)
+    patch = Patch()
+    old_data, new_data = old.get('data', []), new.get('data', [])
+    for i, trace in enumerate(new_data[:len(old_data)]):
+        _diff(patch['data'][i], old_data[i], trace)
+    for trace in new_data[len(old_data):]:
+        patch['data'].append(trace)
+    # Drop surplus traces from the end so earlier indexes stay valid
+    for i in reversed(range(len(new_data), len(old_data))):
+        del patch['data'][i]
+    _diff(patch['layout'], old.get('layout', {}), new.get('layout', {}))
+    # Figures whose traces get reordered can diff to more than they weigh
+    if len(dumps(patch.to_plotly_json())) >= len(dumps(new)):
+        return new_fig
+    return patch
+
+
+def selection_patch(region_visible, old_count, traces):
+    # Patch setting each region trace's visible and swapping the old_count branch traces
+    # after the regions (as the browser has them) for traces
+    patch = Patch()
+    for i, visible in enumerate(region_visible):
+        patch['data'][i]['visible'] = visible
+    first = len(region_visible)
+    for i in reversed(range(first, first + old_count)):
+        del patch['data'][i]
+    patch['data'].extend(traces)
+    return patch
@@ -0,0 +1,16 @@
+import multiprocessing
+import os
+
+# gunicorn settings for wsgi.py; override with MAP_BIND, MAP_WORKERS, MAP_THREADS, MAP_TIMEOUT
+# MAP_WARMUP=1 fills the figure cache before forking (see wsgi.py); it only applies to
+# the server-side highlight, so with the default clientside highlight it is ignored
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('MAP_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('MAP_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('MAP_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('MAP_TIMEOUT', 60))
+
+# Load the data once in the master and fork the workers from it
+preload_app = True
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import html
+import os
+
+import plotly
+from plotly.offline import get_plotlyjs
+
+from fast_json import dumps
+from figure_patch import plain_figure
+from topology import QUANTIZATION, encode_topology, geojson_frame
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# HTML export for the static maps.
+# Each distinct GeoJSON in a figure is stored once, as quantized TopoJSON by default, and
+# attached to its traces in the page (decoded by assets/topology.js) before plotting,
+# instead of embedding full-precision GeoJSON in every trace that uses it.
+# MapBundle writes thin pages that load plotly.js, the decoder and the geometry from
+# content-hashed files in a shared assets directory, written once however many maps go
+# into the output directory.
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+BUNDLE_DIR = 'map_assets'
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>html, body, #map {{ height: 100%; width: 100%; margin: 0; }}</style>
+{scripts}
+</head>
+<body>
+<div id="map" class="plotly-graph-div"></div>
+<script>
+{body}
+</script>
+</body>
+</html>
+"""
+
+# Loaded as a script rather than fetched, so pages opened from disk can read it too
+GEOMETRY = "(window.mapGeometry = window.mapGeometry || {{}})[{key}] = {data};"
+
+PLOT = """var figure = {figure};
+var geometry = {{}};
+{geometry_refs}.forEach(function (ref) {{
+    if (!(ref[1] in geometry)) {{
+        var data = window.mapGeometry[ref[1]];
+        geometry[ref[1]] = data.type === 'Topology' ? window.mapTopology.feature(data, 'regions') : data;
+    }}
+    figure.data[ref[0]].geojson = geometry[ref[1]];
+}});
+Plotly.newPlot('map', figure.data, figure.layout, {{responsive: true}});"""
+
+
+def _read_asset(name):
+    with open(os.path.join(ASSETS_DIR, name)) as f:
+        return f.read()
+
+
+def _script(src):
+    return f'<script type="text/javascript" src="{src}"></script>'
+
+
+def minify_text(text):
+    # Indentation and blank lines only: line breaks stay, so // comments and
+    # semicolon-less statements in page scripts keep working
+    return '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def split_geometry(fig):
+    # (figure without GeoJSON, {key: GeoJSON}, [(trace index, key), ...])
+    figure = plain_figure(fig)
+    geometries, refs = {}, []
+    for i, trace in enumerate(figure.get('data', [])):
+        geojson = trace.get('geojson')
+        if not isinstance(geojson, dict) or geojson.get('type') != 'FeatureCollection':
+            continue
+        # px.choropleth_mapbox repeats the same GeoJSON in every trace; store it once
+        key = hashlib.sha1(dumps(geojson)).hexdigest()[:16]
+        if key not in geometries:
+            geometries[key] = geojson
+        refs.append([i, key])
+        del trace['geojson']
+    return figure, geometries, refs
+
+
+def _script_json(value):
+    # JSON for inside a <script> element: a "</" in a string (say, "</script>" in a
+    # hover label) would otherwise end the element
+    return dumps(value).decode().replace('</', '<\\/')
+
+
+def _geometry_js(key, geojson, topology, quantization):
+    geometry = encode_topology(geojson_frame(geojson), quantization) if topology else geojson
+    return GEOMETRY.format(key=_script_json(key), data=_script_json(geometry))
+
+
+def _page(figure, refs, scripts, title, script=None):
+    body = PLOT.format(figure=_script_json(figure), geometry_refs=_script_json(refs))
+    if script:
+        body += '\n' + script
+    return PAGE.format(title=html.escape(title), scripts='\n'.join(scripts), body=body)
+
+
+def _write(path, data, precompress=False):
+    # Atomic, so concurrent exporters never see a partial file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    copies = [('', data)]
+    if precompress:
+        copies.append(('.gz', gzip.compress(data, compresslevel=9)))
+        if brotli is not None:
+            copies.append(('.br', brotli.compress(data, quality=11)))
+    # The plain file last, so its presence means the set is complete
+    for suffix, content in reversed(copies):
+        tmp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path + suffix)
+
+
+def _written(path, precompress=False):
+    # Whether _write() has already left the full set of copies at path
+    suffixes = ['']
+    if precompress:
+        suffixes.append('.gz')
+        if brotli is not None:
+            suffixes.append('.br')
+    return all(os.path.exists(path + suffix) for suffix in suffixes)
+
+
+class MapBundle:
+    def __init__(self, output_dir, topology=True, quantization=QUANTIZATION, minify=False, precompress=False):
+        self.output_dir = output_dir
+        self.assets_dir = os.path.join(output_dir, BUNDLE_DIR)
+        self.topology = topology
+        self.quantization = quantization
+        self.minify = minify
+        self.precompress = precompress
+        # Asset file names already written by this process, by content key
+        self.assets = {}
+
+    def asset(self, key, root, ext, content, minify=None):
+        # File name of the asset holding content(), written on first use; `key` identifies
+        # the content without building or hashing it again
+        if key not in self.assets:
+            text = content()
+            data = (minify_text(text) if self.minify and minify is not False else text).encode('utf-8')
+            filename = f"{root}-{hashlib.sha1(data).hexdigest()[:16]}{ext}"
+            path = os.path.join(self.assets_dir, filename)
+            # A bundle exported earlier without --precompress gets its copies added now
+            if not _written(path, self.precompress):
+                _write(path, data, self.precompress)
+            self.assets[key] = filename
+        return self.assets[key]
+
+    def library_assets(self):
+        # plotly.js is already minified upstream, so it is written as shipped
+        names = [self.asset('plotly.js', f"plotly-{plotly.__version__}", '.min.js', get_plotlyjs, minify=False)]
+        if self.topology:
+            names.append(self.asset('topology.js', 'topology', '.js', lambda: _read_asset('topology.js')))
+        return names
+
+    def geometry_asset(self, key, geojson):
+        # Encoded once per process and distinct GeoJSON
+        return self.asset(('geometry', key), 'geometry', '.js',
+                          lambda: _geometry_js(key, geojson, self.topology, self.quantization))
+
+    def write(self, fig, path, script=None, title=None):
+        # Thin page at `path` (relative to the output directory) referring to the bundle;
+        # `script` is extra page JavaScript run after the plot is created
+        path = os.path.join(self.output_dir, path)
+        figure, geometries, refs = split_geometry(fig)
+        names = self.library_assets() + [self.geometry_asset(key, geojson) for key, geojson in geometries.items()]
+        prefix = os.path.relpath(self.assets_dir, os.path.dirname(os.path.abspath(path))).replace(os.sep, '/')
+        scripts = [_script(src=f"{prefix}/{name}") for name in names]
+        page = _page(figure, refs, scripts, title or os.path.splitext(os.path.basename(path))[0], script)
+        _write(path, (minify_text(page) if self.minify else page).encode('utf-8'), self.precompress)
+        return path
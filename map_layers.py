@@ -0,0 +1,158 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import html
+
+# Shared figure layers for the Dash maps.
+# branch_layer() draws every branch in a single Scattermapbox trace with a per-point
+# colour array, so the figure no longer carries one trace per company. region_layer()
+# does the same for the economic regions: one Choroplethmapbox over a discrete
+# colorscale, so the region GeoJSON is embedded once instead of once per region.
+# Legends for both are rendered next to the map by color_legend().
+# cluster_layer() draws the branch clusters of branch_clusters.py for one map view, and
+# density_layer() the branch density grid of branch_density.py as a heatmap.
+# highlight_lookup() packs the region/company -> point tables that assets/map_highlight.js
+# uses to highlight a selection in the browser without a server round trip.
+
+PALETTE = px.colors.qualitative.Plotly
+UNSELECTED_OPACITY = 0.15
+REGION_OPACITY = 0.5
+UNSELECTED_REGION_OPACITY = 0.1
+CLUSTER_COLOR = '#2a3f5f'
+CLUSTER_SIZE = 14
+DENSITY_RADIUS = 24  # pixels; about twice a density cell, so neighbouring cells blend
+
+
+def category_color_map(names):
+    return {name: PALETTE[i % len(PALETTE)] for i, name in enumerate(names)}
+
+
+def point_colors(names, color_map):
+    # Look colours up once per category instead of once per row
+    names = names.astype('category')
+    lookup = np.array([color_map.get(name, PALETTE[0]) for name in names.cat.categories] + [PALETTE[0]], dtype=object)
+    return lookup[names.cat.codes.to_numpy()]
+
+
+def discrete_colorscale(colors):
+    # Stepped colorscale where integer z == i is drawn in colors[i]
+    n = len(colors)
+    scale = []
+    for i, color in enumerate(colors):
+        scale += [[i / n, color], [(i + 1) / n, color]]
+    return scale
+
+
+def region_layer(regions, geojson, color_map, selected=None, name="Economic Regions"):
+    # selected: region positions to highlight; None shows every region at full opacity
+    names = regions['ERNAME']
+    return go.Choroplethmapbox(
+        geojson=geojson,
+        locations=regions.index,
+        z=np.arange(len(regions)),
+        zmin=-0.5,
+        zmax=len(regions) - 0.5,
+        colorscale=discrete_colorscale([color_map[name] for name in names]),
+        showscale=False,
+        marker={'opacity': REGION_OPACITY},
+        name=name,
+        hovertext=names,
+        hovertemplate="<b>Economic Region:</b> %{hovertext}<extra></extra>",
+        selectedpoints=None if selected is None else np.asarray(selected).tolist(),
+        unselected={'marker': {'opacity': UNSELECTED_REGION_OPACITY}},
+    )
+
+
+def branch_layer(branches, color_map, selected=None, name="CU branches", rows=None):
+    # selected: row positions to highlight; None leaves every branch at full opacity
+    # rows: each branch's row position in the full table, sent as customdata so clicks
+    # resolve to it exactly (see branch_locator.py); defaults to 0..n-1
+    return go.Scattermapbox(
+        lat=branches["Lat"],
+        lon=branches["Long"],
+        mode='markers',
+        marker=go.scattermapbox.Marker(size=10, color=point_colors(branches['Name'], color_map)),
+        name=name,
+        text=branches["hover"],
+        customdata=np.arange(len(branches)) if rows is None else np.asarray(rows),
+        hovertemplate="<b>CU Name:</b> %{text}<extra></extra>",
+        showlegend=False,
+        selectedpoints=None if selected is None else np.asarray(selected).tolist(),
+        unselected={'marker': {'opacity': UNSELECTED_OPACITY}},
+    )
+
+
+def cluster_layer(lat, lon, counts, hovertext, name="Branch clusters"):
+    # One marker per cluster, sized by its branch count and labelled with it
+    counts = np.asarray(counts)
+    return go.Scattermapbox(
+        lat=lat,
+        lon=lon,
+        mode='markers+text',
+        marker={'size': CLUSTER_SIZE + 6 * np.log2(np.maximum(counts, 1)), 'color': CLUSTER_COLOR,
+                'opacity': 0.75},
+        text=[f"{count:,}" for count in counts],
+        textfont={'color': 'white', 'size': 11},
+        hovertext=hovertext,
+        hovertemplate="%{hovertext}<extra></extra>",
+        name=name,
+        showlegend=False,
+    )
+
+
+def density_layer(lat, lon, weights, name="Branch density"):
+    # Heatmap of grid cells weighted by their branch count
+    return go.Densitymapbox(
+        lat=lat,
+        lon=lon,
+        z=weights,
+        radius=DENSITY_RADIUS,
+        colorscale='YlOrRd',
+        showscale=False,
+        hovertemplate="%{z:,} branches<extra></extra>",
+        name=name,
+    )
+
+
+def color_legend(color_map, title):
+    swatch = {'display': 'inline-block', 'width': '10px', 'height': '10px',
+              'borderRadius': '50%', 'marginRight': '6px'}
+    items = [
+        html.Div([html.Span(style={**swatch, 'backgroundColor': color}), str(name).strip()],
+                 style={'whiteSpace': 'nowrap'})
+        for name, color in color_map.items()
+    ]
+    return html.Div([html.B(title)] + items, style={'marginBottom': '6px'})
+
+
+def legend_panel(*legends):
+    return html.Div(
+        list(legends),
+        style={'position': 'absolute', 'top': '10px', 'right': '10px', 'maxHeight': '80vh',
+               'overflowY': 'auto', 'padding': '6px 8px', 'fontSize': '11px',
+               'backgroundColor': 'rgba(255, 255, 255, 0.85)', 'zIndex': 1},
+    )
+
+
+def highlight_lookup(regions, branches, branch_index):
+    # Positions refer to the region layer's locations and the branch layer's points
+    names = list(regions['ERNAME'])
+    region_position = {name: i for i, name in enumerate(names)}
+    companies = list(branch_index.by_company)
+    company_branches = [branch_index.company(name) for name in companies]
+    branch_company = np.full(len(branches), -1, dtype='int64')
+    for code, positions in enumerate(company_branches):
+        branch_company[positions] = code
+    region_column = branches['ERNAME'].to_numpy()
+    return {
+        'regions': names,
+        'locations': {str(location): i for i, location in enumerate(regions.index)},
+        'region_branches': [branch_index.region(name).tolist() for name in names],
+        'companies': companies,
+        'company_branches': [positions.tolist() for positions in company_branches],
+        'company_regions': [
+            sorted({region_position[name] for name in region_column[positions] if name in region_position})
+            for positions in company_branches
+        ],
+        'branch_company': branch_company.tolist(),
+    }
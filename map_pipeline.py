@@ -0,0 +1,115 @@
+from branch_data import ingest_branches, load_branches
+from branch_index import BranchIndex
+from data_cache import CACHE_DIR
+from region_assignments import assign_regions, join_assigned
+from region_store import SOURCE_PATH, load_regions, regions_version
+
+# Lazy region/branch pipeline.
+# Steps are recorded on an immutable query and only run by collect(). The optimizer
+# pushes the province filter into the region read, drops no-op reprojections and
+# prefilters branches against the regions' bounding box before building point
+# geometries and running the spatial join. Join results are cached per branch
+# location, so only new or moved branches are tested against the regions.
+# Without a filter_province() step every province is read.
+# load_map_data() runs the pipeline the map scripts share.
+
+
+class MapQuery:
+    def __init__(self, source_path=SOURCE_PATH, store_dir=CACHE_DIR, steps=()):
+        self.source_path = source_path
+        self.store_dir = store_dir
+        self.steps = tuple(steps)
+
+    def _with_step(self, *step):
+        return MapQuery(self.source_path, self.store_dir, self.steps + (step,))
+
+    def filter_province(self, province):
+        return self._with_step('filter_province', str(province))
+
+    def to_crs(self, epsg):
+        return self._with_step('to_crs', int(epsg))
+
+    def join_branches(self, branches, how='left', predicate='within'):
+        # branches: a DataFrame with 'Lat'/'Long' columns in WGS84
+        return self._with_step('join_branches', branches, how, predicate)
+
+    def optimize(self):
+        province = None
+        epsg = None
+        join = None
+        for step in self.steps:
+            if step[0] == 'filter_province':
+                province = step[1]
+            elif step[0] == 'to_crs':
+                epsg = step[1]
+            elif step[0] == 'join_branches':
+                join = step[1:]
+
+        # Filter first (pushed into the read), then reproject, then join against the
+        # reprojected regions with a bbox prefilter on the branch coordinates
+        plan = [('read_regions', province)]
+        # The region store is already in EPSG:4326, so that reprojection is a no-op
+        if epsg is not None and epsg != 4326:
+            plan.append(('to_crs', epsg))
+        if join is not None:
+            plan.append(('bbox_prefilter',))
+            plan.append(('join_branches',) + join)
+        return plan
+
+    def explain(self):
+        return [step[0] if step[0] != 'join_branches' else f"join_branches(how={step[2]!r}, predicate={step[3]!r})"
+                for step in self.optimize()]
+
+    def collect(self):
+        province = None
+        regions = None
+        candidates = None
+        branches_with_regions = None
+
+        for step in self.optimize():
+            if step[0] == 'read_regions':
+                province = step[1]
+                regions = load_regions(self.source_path, province=province, store_dir=self.store_dir)
+            elif step[0] == 'to_crs':
+                regions = regions.to_crs(epsg=step[1])
+            elif step[0] == 'bbox_prefilter':
+                candidates = _bbox_mask(regions)
+            elif step[0] == 'join_branches':
+                _, branches, how, predicate = step
+                labels = assign_regions(
+                    branches, regions, province, regions_version(province, self.store_dir),
+                    predicate=predicate,
+                    bbox_mask=candidates(branches) if candidates is not None else None,
+                    cache_dir=self.store_dir,
+                )
+                branches_with_regions = join_assigned(branches, regions, labels, how)
+
+        return regions, branches_with_regions
+
+
+def load_map_data(file_path, province, hover):
+    # (branches, regions, branches with their region, BranchIndex) for a province's map.
+    # Branches are loaded with their hover text and point geometry built column-wise;
+    # the BranchIndex holds row positions per company, region and (region, company)
+    branches = ingest_branches(load_branches(file_path), hover=hover)
+    regions, branches_with_regions = (
+        MapQuery()
+        .filter_province(province)
+        .to_crs(4326)
+        .join_branches(branches, how="left", predicate="within")
+        .collect()
+    )
+    return branches, regions, branches_with_regions, BranchIndex(branches_with_regions)
+
+
+def _bbox_mask(regions):
+    # Region bounds in lon/lat so they can be compared with the raw branch columns
+    bounds = regions.to_crs(epsg=4326).total_bounds if regions.crs.to_epsg() != 4326 else regions.total_bounds
+    min_lon, min_lat, max_lon, max_lat = bounds
+
+    def mask(branches):
+        lon = branches['Long'].to_numpy(dtype='float64')
+        lat = branches['Lat'].to_numpy(dtype='float64')
+        return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+    return mask
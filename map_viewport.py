@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+from branch_clusters import TILE_SIZE, inverse_mercator, mercator
+
+# Map viewport tracking for the Dash maps that draw only what is in view.
+# Mapbox relayoutData reports the view incrementally (a pan sends only the centre, a zoom
+# the zoom, both with 'mapbox._derived' corner coordinates when plotly.js provides them),
+# so the last full view is kept in a dcc.Store and updated from each event.
+
+DEFAULT_VIEW = {'center': {'lat': 50, 'lon': -85}, 'zoom': 5}
+# Graph size assumed when the browser has not reported the visible corners
+DEFAULT_SIZE = (1280, 800)  # pixels
+
+
+def update_view(relayoutData, view=None):
+    # New view dict from a relayoutData event, or None when the event did not move the map
+    view = dict(view or DEFAULT_VIEW)
+    if not relayoutData:
+        return None
+    changed = False
+    if 'mapbox.center' in relayoutData:
+        view['center'] = relayoutData['mapbox.center']
+        changed = True
+    if 'mapbox.zoom' in relayoutData:
+        view['zoom'] = relayoutData['mapbox.zoom']
+        changed = True
+    derived = relayoutData.get('mapbox._derived') or {}
+    if derived.get('coordinates'):
+        corners = np.asarray(derived['coordinates'], dtype='float64')
+        view['bounds'] = [corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max()]
+        changed = True
+    elif changed:
+        # Stale once the map moved without reporting its corners
+        view.pop('bounds', None)
+    return view if changed else None
+
+
+def view_bounds(view, size=DEFAULT_SIZE):
+    # (west, south, east, north) of a view, from its reported corners or else estimated
+    # from its centre and zoom for a graph of `size` pixels
+    if view.get('bounds'):
+        return tuple(view['bounds'])
+    x, y = mercator(view['center']['lat'], view['center']['lon'])
+    scale = TILE_SIZE * 2 ** view['zoom']
+    half_width, half_height = size[0] / 2 / scale, size[1] / 2 / scale
+    north, west = inverse_mercator(x - half_width, y - half_height)
+    south, east = inverse_mercator(x + half_width, y + half_height)
+    return float(west), float(south), float(east), float(north)
+
+
+def padded_bounds(bounds, margin):
+    # Bounds grown by `margin` times their width and height on every side, so small
+    # pans stay inside what was already sent
+    west, south, east, north = bounds
+    dx, dy = (east - west) * margin, (north - south) * margin
+    return max(west - dx, -180.0), max(south - dy, -85.0), min(east + dx, 180.0), min(north + dy, 85.0)
+
+
+class GridIndex:
+    # Row positions bucketed on a lon/lat grid, sorted by cell, so a bounds query reads
+    # one contiguous slice per grid row it overlaps and checks only those points
+    def __init__(self, lat, lon, points_per_cell=16):
+        lat = np.asarray(lat, dtype='float64')
+        lon = np.asarray(lon, dtype='float64')
+        rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        lat, lon = lat[rows], lon[rows]
+        if len(rows):
+            self.west, self.south = float(lon.min()), float(lat.min())
+            area = max((lon.max() - self.west) * (lat.max() - self.south), 1e-12)
+            self.cell = float(np.sqrt(area * points_per_cell / len(rows)))
+            self.nx = int((lon.max() - self.west) / self.cell) + 1
+            self.ny = int((lat.max() - self.south) / self.cell) + 1
+        else:
+            self.west = self.south = 0.0
+            self.cell, self.nx, self.ny = 1.0, 1, 1
+        cx = np.clip(np.floor((lon - self.west) / self.cell).astype('int64'), 0, self.nx - 1)
+        cy = np.clip(np.floor((lat - self.south) / self.cell).astype('int64'), 0, self.ny - 1)
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.rows = keys[order], rows[order]
+        self.lat, self.lon = lat[order], lon[order]
+
+    def _cell(self, value, origin, cells):
+        return min(max(int(math.floor((value - origin) / self.cell)), 0), cells - 1)
+
+    def query(self, bounds):
+        # Sorted row positions of the points within (west, south, east, north)
+        west, south, east, north = bounds
+        if east < west or north < south:
+            return np.empty(0, dtype='int64')
+        x0, x1 = self._cell(west, self.west, self.nx), self._cell(east, self.west, self.nx)
+        ys = np.arange(self._cell(south, self.south, self.ny), self._cell(north, self.south, self.ny) + 1)
+        starts = np.searchsorted(self.keys, ys * self.nx + x0)
+        lengths = np.searchsorted(self.keys, ys * self.nx + x1, side='right') - starts
+        total = lengths.sum()
+        if total == 0:
+            return np.empty(0, dtype='int64')
+        # Concatenated ranges starts[i]:starts[i] + lengths[i] without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        lat, lon = self.lat[positions], self.lon[positions]
+        inside = (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+        return np.sort(self.rows[positions[inside]])
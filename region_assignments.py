@@ -0,0 +1,113 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR, read_meta, write_meta
+from region_store import province_key
+
+# Persistent branch -> economic region assignments.
+# Each branch is keyed by a hash of its (Lat, Long); the region it falls in is stored
+# next to the branch cache. On reload only new or moved branches are tested against
+# the regions' STRtree, so editing a few rows costs a few point-in-polygon tests.
+
+NO_REGION = -1
+
+
+def location_keys(branches):
+    return pd.util.hash_pandas_object(branches[['Lat', 'Long']], index=False).to_numpy()
+
+
+def _cache_paths(province, predicate, cache_dir):
+    base = os.path.join(cache_dir, f"assignments_{province_key(province)}_{predicate}")
+    return base + '.meta.json', base + '.parquet'
+
+
+def _load_cache(meta_path, cache_path, regions_version):
+    meta = read_meta(meta_path)
+    if meta.get('regions_version') != regions_version or not os.path.exists(cache_path):
+        return pd.Series(dtype='int64')
+    cached = pd.read_parquet(cache_path)
+    return pd.Series(cached['region'].to_numpy(), index=cached['key'].to_numpy())
+
+
+def _locate(lon, lat, regions, predicate, bbox_mask):
+    # Region label for each point, NO_REGION when nothing matches
+    labels = np.full(len(lon), NO_REGION, dtype='int64')
+    candidates = np.flatnonzero(bbox_mask) if bbox_mask is not None else np.arange(len(lon))
+    if len(candidates) == 0:
+        return labels
+
+    points = gpd.GeoSeries(gpd.points_from_xy(lon[candidates], lat[candidates]), crs="EPSG:4326").to_crs(regions.crs)
+    point_idx, region_idx = regions.sindex.query(points.values, predicate=predicate)
+    # Keep the first matching region per point
+    order = np.lexsort((region_idx, point_idx))
+    point_idx, region_idx = point_idx[order], region_idx[order]
+    _, first = np.unique(point_idx, return_index=True)
+    labels[candidates[point_idx[first]]] = regions.index.to_numpy()[region_idx[first]]
+    return labels
+
+
+def assign_regions(branches, regions, province, regions_version, predicate='within', bbox_mask=None,
+                   cache_dir=CACHE_DIR):
+    keys = location_keys(branches)
+    meta_path, cache_path = _cache_paths(province, predicate, cache_dir)
+    cached = _load_cache(meta_path, cache_path, regions_version) if regions_version else pd.Series(dtype='int64')
+
+    positions = pd.Index(cached.index).get_indexer(keys)
+    missing = positions < 0
+    labels = np.full(len(keys), NO_REGION, dtype='int64')
+    labels[~missing] = cached.to_numpy()[positions[~missing]]
+
+    if missing.any():
+        lon = branches['Long'].to_numpy(dtype='float64')[missing]
+        lat = branches['Lat'].to_numpy(dtype='float64')[missing]
+        mask = bbox_mask[missing] if bbox_mask is not None else None
+        labels[missing] = _locate(lon, lat, regions, predicate, mask)
+
+    # Persist only the current table's keys so moved or deleted rows don't accumulate
+    unique_keys = np.unique(keys)
+    stale = len(cached) != len(unique_keys)
+    if regions_version and (missing.any() or stale):
+        os.makedirs(cache_dir, exist_ok=True)
+        table = pd.DataFrame({'key': keys, 'region': labels}).drop_duplicates('key')
+        tmp_path = cache_path + '.tmp'
+        table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        write_meta(meta_path, {'regions_version': regions_version})
+
+    return labels
+
+
+def join_assigned(branches, regions, labels, how='left'):
+    # Same layout as gpd.sjoin(branches, regions, how, predicate): branch columns,
+    # geometry, index_right, then the region attributes
+    if isinstance(branches, gpd.GeoDataFrame) and 'geometry' in branches.columns:
+        result = branches.copy()
+    else:
+        result = gpd.GeoDataFrame(
+            branches,
+            geometry=gpd.points_from_xy(branches['Long'], branches['Lat']),
+            crs="EPSG:4326",
+        )
+    result = result.to_crs(regions.crs)
+
+    matched = labels != NO_REGION
+    if how != 'left':
+        result = result[matched]
+        labels = labels[matched]
+        matched = matched[matched]
+
+    positions = regions.index.get_indexer(labels)
+    attributes = pd.DataFrame(regions.drop(columns=regions.geometry.name)).iloc[np.where(matched, positions, 0)]
+    attributes = attributes.reset_index()
+    attributes = attributes.rename(columns={attributes.columns[0]: 'index_right'})
+    attributes.index = result.index
+    if not matched.all():
+        attributes['index_right'] = attributes['index_right'].astype('float64')
+        attributes.loc[~matched, :] = np.nan
+
+    for column in attributes.columns:
+        result[column] = attributes[column]
+    return result
@@ -0,0 +1,140 @@
+import os
+import sys
+
+import fiona
+import geopandas as gpd
+import shapely
+
+from data_cache import CACHE_DIR, file_digest, file_signature, read_meta, write_meta
+
+# Preprocessed economic region store.
+# The StatCan shapefile is read once, repaired, filtered to a province, reprojected to
+# WGS84 and validated; the result is persisted as GeoParquet so the apps load it directly.
+# Simplified copies are stored alongside for the zoom levels in DETAIL_LEVELS.
+
+SOURCE_PATH = 'ler_000a21a_e.shp'
+SOURCE_EXTENSIONS = ['.shp', '.shx', '.dbf', '.prj']
+REGION_COLUMNS = ['ERUID', 'ERNAME', 'PRUID']
+DEFAULT_PROVINCE = '35'  # Ontario
+STORE_VERSION = 2
+
+# (minimum map zoom, simplification tolerance in degrees); 0.0 keeps full detail
+DETAIL_LEVELS = [(0, 0.02), (6, 0.005), (8, 0.001), (10, 0.0)]
+
+
+def _source_files(source_path):
+    stem = os.path.splitext(source_path)[0]
+    return [stem + ext for ext in SOURCE_EXTENSIONS]
+
+
+def province_key(province):
+    # File name part for a province; None means every province
+    return 'all' if province is None else province
+
+
+def _store_paths(province, store_dir):
+    base = os.path.join(store_dir, f"regions_{province_key(province)}")
+    return base + '.meta.json', base + '.parquet'
+
+
+def _level_path(province, level, store_dir):
+    return os.path.join(store_dir, f"regions_{province_key(province)}_lod{level}.parquet")
+
+
+def level_for_zoom(zoom):
+    level = 0
+    for i, (min_zoom, _) in enumerate(DETAIL_LEVELS):
+        if zoom >= min_zoom:
+            level = i
+    return level
+
+
+def simplify_regions(regions, tolerance):
+    if tolerance == 0:
+        return regions
+    simplified = regions.copy()
+    if hasattr(shapely, 'coverage_simplify'):
+        # Simplifies shared borders once, so neighbouring regions stay gap-free
+        simplified['geometry'] = shapely.coverage_simplify(regions.geometry.values, tolerance)
+    else:
+        simplified['geometry'] = regions.geometry.simplify(tolerance, preserve_topology=True)
+    simplified['geometry'] = simplified.geometry.make_valid()
+    return simplified
+
+
+def validate_regions(regions, province):
+    missing = [column for column in REGION_COLUMNS if column not in regions.columns]
+    if missing:
+        raise ValueError(f"Region data is missing columns: {missing}")
+    if regions.empty:
+        raise ValueError(f"No economic regions found for province {province!r}")
+    if regions.crs is None or regions.crs.to_epsg() != 4326:
+        raise ValueError(f"Region data must be in EPSG:4326, got {regions.crs}")
+    if not regions.geometry.is_valid.all():
+        raise ValueError("Region data contains invalid geometries after repair")
+
+
+def build_regions(source_path=SOURCE_PATH, province=DEFAULT_PROVINCE, store_dir=CACHE_DIR):
+    # Ensure the SHX file is restored if missing or corrupted. The province filter is
+    # pushed into the read so other provinces are never decoded or reprojected;
+    # province None keeps them all
+    where = f"PRUID = '{province}'" if province is not None else None
+    with fiona.Env(SHAPE_RESTORE_SHX='YES'):
+        regions = gpd.read_file(source_path, engine='fiona', where=where)
+
+    regions = regions.to_crs(epsg=4326)
+    regions['geometry'] = regions.geometry.make_valid()
+    validate_regions(regions, province)
+
+    os.makedirs(store_dir, exist_ok=True)
+    meta_path, store_path = _store_paths(province, store_dir)
+    tmp_path = store_path + '.tmp'
+    regions.to_parquet(tmp_path, index=True)
+    os.replace(tmp_path, store_path)
+    for level, (_, tolerance) in enumerate(DETAIL_LEVELS):
+        if tolerance:
+            level_path = _level_path(province, level, store_dir)
+            simplify_regions(regions, tolerance).to_parquet(level_path + '.tmp', index=True)
+            os.replace(level_path + '.tmp', level_path)
+    write_meta(meta_path, {
+        'version': STORE_VERSION,
+        'province': province,
+        'source': file_signature(_source_files(source_path)),
+        'digest': file_digest(store_path),
+    })
+    return regions
+
+
+def load_regions(source_path=SOURCE_PATH, province=DEFAULT_PROVINCE, store_dir=CACHE_DIR):
+    meta_path, store_path = _store_paths(province, store_dir)
+    meta = read_meta(meta_path)
+    fresh = (
+        meta.get('version') == STORE_VERSION
+        and meta.get('source') == file_signature(_source_files(source_path))
+        and os.path.exists(store_path)
+    )
+    if fresh:
+        return gpd.read_parquet(store_path)
+    return build_regions(source_path, province, store_dir)
+
+
+def load_region_levels(source_path=SOURCE_PATH, province=DEFAULT_PROVINCE, store_dir=CACHE_DIR):
+    # One GeoDataFrame per entry of DETAIL_LEVELS, coarsest first
+    full = load_regions(source_path, province, store_dir)
+    return [
+        gpd.read_parquet(_level_path(province, level, store_dir)) if tolerance else full
+        for level, (_, tolerance) in enumerate(DETAIL_LEVELS)
+    ]
+
+
+def regions_version(province=DEFAULT_PROVINCE, store_dir=CACHE_DIR):
+    # Content hash of the stored regions; derived caches key on it
+    meta_path, _ = _store_paths(province, store_dir)
+    return read_meta(meta_path).get('digest')
+
+
+if __name__ == '__main__':
+    # Build step: python region_store.py [PRUID ...]
+    for pruid in sys.argv[1:] or [DEFAULT_PROVINCE]:
+        built = build_regions(province=pruid)
+        print(f"Province {pruid}: {len(built)} economic regions stored")
@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import os
+
+from flask import Response, abort, request, send_file
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Region geometry published as immutable static files.
+# Each file is named after a hash of its content and written once with gzip (and, when
+# available, brotli) copies next to it. The maps refer to it by URL, so browsers fetch
+# the outlines once and then answer repeat views from their cache, and figures and
+# callbacks carry a short URL instead of the GeoJSON.
+
+URL_PREFIX = '/geometry/'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class GeometryStore:
+    def __init__(self, directory):
+        # Absolute, since Flask resolves relative paths against the app's root
+        self.directory = os.path.abspath(directory)
+        os.makedirs(directory, exist_ok=True)
+
+    def publish(self, name, data):
+        # File name for the encoded GeoJSON `data`; unchanged content keeps its name
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        filename = f"{name}-{digest}.json"
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            _write(path + '.gz', gzip.compress(data, compresslevel=9))
+            if brotli is not None:
+                _write(path + '.br', brotli.compress(data, quality=11))
+            # The plain file last, so its presence means the set is complete
+            _write(path, data)
+        return filename
+
+    def url(self, filename, url_prefix=URL_PREFIX):
+        return url_prefix + filename
+
+    def response(self, filename):
+        path = os.path.join(self.directory, os.path.basename(filename))
+        if not filename.endswith('.json') or not os.path.exists(path):
+            abort(404)
+        etag = filename[:-len('.json')].rsplit('-', 1)[-1]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            encoding = None
+            for name, suffix in ENCODINGS:
+                if request.accept_encodings[name] and os.path.exists(path + suffix):
+                    encoding, path = name, path + suffix
+                    break
+            response = send_file(path, mimetype='application/json', conditional=False, etag=False)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def register(self, server, url_prefix=URL_PREFIX):
+        server.add_url_rule(url_prefix + '<path:filename>', 'geometry_asset', self.response)
@@ -0,0 +1,35 @@
+import os
+import threading
+
+from disk_cache import DiskCache
+
+# Concurrent misses on DiskCache from the threads of one worker (gunicorn gthread).
+#   python -m pytest test_disk_cache.py
+
+
+def test_concurrent_misses(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    errors = []
+
+    def build():
+        return {'values': list(range(1000))}
+
+    def worker(i, barrier):
+        barrier.wait()
+        try:
+            assert cache.get(('key', i % 2), build, 'version') == build()
+        except Exception as error:
+            errors.append(error)
+
+    for _ in range(20):
+        cache.clear()
+        barrier = threading.Barrier(8)
+        threads = [threading.Thread(target=worker, args=(i, barrier)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    # Both entries in place and no temporary files left behind
+    assert sorted(name.endswith('.json') for name in os.listdir(tmp_path)) == [True, True]
@@ -0,0 +1,153 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# TopoJSON encoding of the region polygons.
+# Coordinates are quantized to an integer grid, rings are cut into arcs at the points
+# where neighbouring regions stop sharing a border, and each shared arc is stored once
+# (referenced as ~i when a ring walks it backwards) as delta-encoded integers.
+# decode_topology() here and assets/topology.js in the browser turn it back into GeoJSON.
+
+QUANTIZATION = 100_000
+
+
+def _polygons(geom):
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == 'Polygon':
+        return [geom]
+    if geom.geom_type in ('MultiPolygon', 'GeometryCollection'):
+        return [polygon for part in shapely.get_parts(geom) for polygon in _polygons(part)]
+    # Lines and points left over from make_valid() have no area to draw
+    return []
+
+
+def _quantized_ring(ring, translate, scale):
+    # Open ring (no closing point) on the integer grid, repeated points dropped
+    points = np.round((shapely.get_coordinates(ring)[:-1] - translate) / scale).astype('int64')
+    if len(points) == 0:
+        return points
+    keep = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    if not keep.any():
+        return points[:1]
+    return points[keep]
+
+
+def _point_keys(points):
+    return (points[:, 0] << 32) | points[:, 1]
+
+
+def _junctions(rings):
+    # Points whose neighbours differ between the rings passing through them
+    keys = np.concatenate([_point_keys(ring) for ring in rings])
+    prev = np.concatenate([np.roll(_point_keys(ring), 1) for ring in rings])
+    nxt = np.concatenate([np.roll(_point_keys(ring), -1) for ring in rings])
+    pairs = np.unique(np.column_stack([keys, np.minimum(prev, nxt), np.maximum(prev, nxt)]), axis=0)
+    points, counts = np.unique(pairs[:, 0], return_counts=True)
+    return points[counts > 1]
+
+
+def _ring_arcs(ring, junctions):
+    keys = _point_keys(ring)
+    cuts = np.flatnonzero(np.isin(keys, junctions))
+    if len(cuts) == 0:
+        # Closed ring without junctions: start at its smallest point so the same ring
+        # walked from anywhere, in either direction, yields the same arc
+        start = int(np.argmin(keys))
+        ring = np.roll(ring, -start, axis=0)
+        return [np.vstack([ring, ring[:1]])]
+    ring = np.roll(ring, -cuts[0], axis=0)
+    closed = np.vstack([ring, ring[:1]])
+    bounds = list(cuts - cuts[0]) + [len(ring)]
+    return [closed[start:end + 1] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def encode_topology(gdf, quantization=QUANTIZATION, name='regions'):
+    geoms = gdf.geometry.values
+    xmin, ymin, xmax, ymax = shapely.total_bounds(geoms)
+    scale = np.array([(xmax - xmin) / (quantization - 1) or 1.0, (ymax - ymin) / (quantization - 1) or 1.0])
+    translate = np.array([xmin, ymin])
+
+    # Feature -> polygons -> rings, as positions into `rings`
+    rings, shapes = [], []
+    for geom in geoms:
+        polygons = []
+        for polygon in _polygons(geom):
+            polygon_rings = [_quantized_ring(ring, translate, scale) for ring in [polygon.exterior, *polygon.interiors]]
+            if len(polygon_rings[0]) < 3:
+                continue
+            polygons.append([])
+            for ring in polygon_rings:
+                if len(ring) >= 3:
+                    polygons[-1].append(len(rings))
+                    rings.append(ring)
+        shapes.append(polygons)
+
+    junctions = _junctions(rings) if rings else np.empty(0, dtype='int64')
+    arcs, arc_ids = [], {}
+
+    def arc_index(arc):
+        forward = arc.tobytes()
+        if forward in arc_ids:
+            return arc_ids[forward]
+        backward = arc[::-1].tobytes()
+        if backward in arc_ids:
+            return ~arc_ids[backward]
+        arc_ids[forward] = len(arcs)
+        arcs.append(arc)
+        return arc_ids[forward]
+
+    ring_arcs = [[arc_index(arc) for arc in _ring_arcs(ring, junctions)] for ring in rings]
+
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict('records')
+    geometries = []
+    for label, props, polygons in zip(gdf.index, properties, shapes):
+        geometry = {'id': str(label), 'properties': props}
+        if not polygons:
+            geometry['type'] = None
+        elif len(polygons) == 1:
+            geometry.update(type='Polygon', arcs=[ring_arcs[ring] for ring in polygons[0]])
+        else:
+            geometry.update(type='MultiPolygon',
+                            arcs=[[ring_arcs[ring] for ring in polygon] for polygon in polygons])
+        geometries.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': scale.tolist(), 'translate': translate.tolist()},
+        'objects': {name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        # First point absolute, the rest as steps from the previous point
+        'arcs': [np.vstack([arc[:1], np.diff(arc, axis=0)]) for arc in arcs],
+    }
+
+
+def decode_topology(topology, name='regions'):
+    # GeoJSON FeatureCollection for one object of the topology
+    scale = np.asarray(topology['transform']['scale'])
+    translate = np.asarray(topology['transform']['translate'])
+    arcs = [np.cumsum(np.asarray(arc, dtype='int64'), axis=0) * scale + translate for arc in topology['arcs']]
+
+    def ring(indexes):
+        parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in indexes]
+        # Consecutive arcs share their junction point
+        return np.vstack([parts[0]] + [part[1:] for part in parts[1:]]).tolist()
+
+    features = []
+    for geometry in topology['objects'][name]['geometries']:
+        if geometry['type'] == 'Polygon':
+            shape = {'type': 'Polygon', 'coordinates': [ring(r) for r in geometry['arcs']]}
+        elif geometry['type'] == 'MultiPolygon':
+            shape = {'type': 'MultiPolygon', 'coordinates': [[ring(r) for r in p] for p in geometry['arcs']]}
+        else:
+            shape = None
+        features.append({'id': geometry.get('id'), 'type': 'Feature',
+                         'properties': geometry.get('properties', {}), 'geometry': shape})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def geojson_frame(geojson):
+    # GeoDataFrame indexed by feature id, for encoding a figure's GeoJSON
+    features = geojson['features']
+    gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+    gdf.index = [feature.get('id', i) for i, feature in enumerate(features)]
+    return gdf
@@ -0,0 +1,22 @@
+import gc
+
+# Production entry point for the Dash map:
+#   gunicorn -c gunicorn.conf.py wsgi:server
+# gunicorn.conf.py preloads this module in the master process, so the branches, regions,
+# spatial indexes and prebuilt GeoJSON are loaded once and the forked workers share them
+# copy-on-write. Selection state is kept per session in the browser, so any worker can
+# serve any request.
+
+import extended_map_dash8
+from extended_map_dash8 import server
+
+# With MAP_WARMUP=1 the figure cache is filled here, before any worker is forked, so
+# /healthz only answers once every worker starts with a warm cache. Only the server-side
+# highlight (CLIENTSIDE_HIGHLIGHT off) reads those figures; under the default clientside
+# highlight the setting is ignored, with a note at startup
+if extended_map_dash8.WARM_UP:
+    extended_map_dash8.warm_up_figures()
+
+# Take everything loaded so far out of the collector's generations; otherwise the first
+# collection in each worker writes to every object header and un-shares those pages
+gc.freeze()